@@ -1,4 +1,6 @@
 from shared_functions import *
+from search_results import format_similarity
+from startup_profile import print_startup_report, startup_phase
 
 def main():
     """Main function for advanced search demonstrations"""
@@ -7,15 +9,18 @@ def main():
         print("=" * 50)
         print("Loading food database with advanced filtering capabilities...")
 
-        food_items = load_food_data('./FoodDataSet.json')
+        with startup_phase("load food catalog"):
+            food_items = load_food_data('./FoodDataSet.json')
         print(f"✅ Loaded {len(food_items)} food items successfully")
 
         # Create collection specifically for advanced search operations
-        collection = create_similarity_search_collection(
+        collection = create_similarity_search_view(
             "advanced_food_search",
             {'description': 'A collection for advanced search demos'}
         )
-        populate_similarity_collection(collection, food_items)
+        with startup_phase("populate vector index"):
+            populate_similarity_collection(collection, food_items)
+        print_startup_report()
 
         interactive_advanced_search(collection)
         
@@ -151,6 +156,8 @@ def perform_combined_filtered_search(collection):
     query = input("Enter search query: ").strip()
     cuisine = input("Enter cuisine type (optional): ").strip()
     max_calories_input = input("Enter maximum calories (optional): ").strip()
+    ingredient = input("Enter required ingredient (optional): ").strip()
+    min_protein_input = input("Enter minimum protein in grams (optional): ").strip()
     
     if not query:
         print("❌ Please enter a search term")
@@ -158,6 +165,8 @@ def perform_combined_filtered_search(collection):
     
     cuisine_filter = cuisine if cuisine else None
     max_calories = int(max_calories_input) if max_calories_input.isdigit() else None
+    ingredient_filter = ingredient if ingredient else None
+    min_protein = int(min_protein_input) if min_protein_input.isdigit() else None
     
     # Build description of applied filters
     filter_description = []
@@ -165,6 +174,10 @@ def perform_combined_filtered_search(collection):
         filter_description.append(f"cuisine: {cuisine_filter}")
     if max_calories:
         filter_description.append(f"max calories: {max_calories}")
+    if ingredient_filter:
+        filter_description.append(f"ingredient: {ingredient_filter}")
+    if min_protein:
+        filter_description.append(f"min protein: {min_protein}g")
     
     filter_text = ", ".join(filter_description) if filter_description else "no filters"
     
@@ -174,7 +187,9 @@ def perform_combined_filtered_search(collection):
         collection, query, 
         cuisine_filter=cuisine_filter, 
         max_calories=max_calories, 
-        n_results=5
+        n_results=5,
+        ingredient_filter=ingredient_filter,
+        min_protein=min_protein
     )
     
     display_search_results(results, f"Combined Filtered Results ({filter_text})")
@@ -205,7 +220,18 @@ def run_search_demonstrations(collection):
         }
     ]
     
-    for i, demo in enumerate(demonstrations, 1):
+    # Run every demonstration query up front in a single batch
+    all_results = perform_batch_similarity_search(
+        collection,
+        [demo['query'] for demo in demonstrations],
+        filters=[
+            {"cuisine_filter": demo['cuisine_filter'], "max_calories": demo['max_calories']}
+            for demo in demonstrations
+        ],
+        n_results=3
+    )
+
+    for i, (demo, results) in enumerate(zip(demonstrations, all_results), 1):
         print(f"\n{i}. {demo['title']}")
         print(f"   Query: '{demo['query']}'")
         
@@ -218,14 +244,6 @@ def run_search_demonstrations(collection):
         if filters:
             print(f"   Filters: {', '.join(filters)}")
         
-        results = perform_filtered_similarity_search(
-            collection,
-            demo['query'],
-            cuisine_filter=demo['cuisine_filter'],
-            max_calories=demo['max_calories'],
-            n_results=3
-        )
-        
         display_search_results(results, demo['title'], show_details=False)
         
         input("\n⏸️  Press Enter to continue to next demonstration...")
@@ -257,15 +275,13 @@ def display_search_results(results, title, show_details=True):
         return
     
     for i, result in enumerate(results, 1):
-        score_percentage = result['similarity_score'] * 100
-        
         if show_details:
             print(f"\n{i}. 🍽️  {result['food_name']}")
-            print(f"   📊 Similarity Score: {score_percentage:.1f}%")
+            print(f"   📊 Similarity Score: {format_similarity(result)}")
             print(f"   🏷️  Cuisine: {result['cuisine_type']}")
             print(f"   🔥 Calories: {result['food_calories_per_serving']}")
             print(f"   📝 Description: {result['food_description']}")
         else:
-            print(f"   {i}. {result['food_name']} ({score_percentage:.1f}% match)")
+            print(f"   {i}. {result['food_name']} ({format_similarity(result, ' match')})")
     
     print("=" * 50)
@@ -0,0 +1,68 @@
+import threading
+from typing import Dict, List, Optional
+
+import config
+
+class AnswerPolicy:
+    """Decides when a RAG query is answered from the search results alone instead of the LLM.
+
+    The template answer is used when retrieval is decisive (a strong top match
+    well ahead of the runner-up), when too many generations are already
+    queued, or when the expected wait for generation, estimated from recent
+    generation times, is over the latency budget.
+    """
+
+    def __init__(self, decisive_similarity: float = config.SHORT_CIRCUIT_SIMILARITY,
+                 decisive_margin: float = config.SHORT_CIRCUIT_MARGIN,
+                 max_queue_depth: int = config.LLM_MAX_QUEUE_DEPTH,
+                 latency_budget_seconds: float = config.LLM_LATENCY_BUDGET_SECONDS):
+        self.decisive_similarity = decisive_similarity
+        self.decisive_margin = decisive_margin
+        self.max_queue_depth = max_queue_depth
+        self.latency_budget_seconds = latency_budget_seconds
+        # Exponentially weighted mean of recent generation times
+        self.generation_seconds: Optional[float] = None
+        self.decisions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe_generation(self, seconds: float, weight: float = 0.2):
+        with self._lock:
+            if self.generation_seconds is None:
+                self.generation_seconds = seconds
+            else:
+                self.generation_seconds += weight * (seconds - self.generation_seconds)
+
+    def expected_latency(self, queue_depth: int = 0, batch_size: int = 1) -> float:
+        """Seconds until a new generation would finish, given how many are queued ahead of it"""
+        if self.generation_seconds is None:
+            return 0.0
+        batches_ahead = -(-queue_depth // max(1, batch_size))
+        return self.generation_seconds * (1 + batches_ahead)
+
+    def decide(self, search_results: List[Dict], queue_depth: int = 0, batch_size: int = 1) -> Optional[str]:
+        """Return why the LLM should be skipped, or None to generate as usual"""
+        scores = [result.get('similarity_score') for result in search_results]
+        reason = None
+        # Keyword-only hits carry no similarity, so they can never make retrieval decisive
+        if scores and None not in scores and scores[0] >= self.decisive_similarity and (
+                len(scores) == 1 or scores[0] - scores[1] >= self.decisive_margin):
+            reason = "decisive match"
+        elif queue_depth >= self.max_queue_depth:
+            reason = "LLM queue full"
+        elif queue_depth and self.expected_latency(queue_depth, batch_size) > self.latency_budget_seconds:
+            # Only waiting behind other requests counts; a lone request must still generate,
+            # which also keeps the generation time estimate current once load drops
+            reason = "latency budget exceeded"
+        with self._lock:
+            key = reason or "generated"
+            self.decisions[key] = self.decisions.get(key, 0) + 1
+        return reason
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "decisions": dict(self.decisions),
+                "mean_generation_seconds": self.generation_seconds,
+            }
+
+answer_policy = AnswerPolicy()
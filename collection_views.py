@@ -0,0 +1,28 @@
+from typing import Dict
+
+class CollectionView:
+    """A named, described view over a shared physical collection.
+
+    Reads and writes go straight to the physical collection, so several views
+    hold one copy of the vectors and share one embedding pass. Only the name
+    and metadata (e.g. description) belong to the view.
+    """
+
+    def __init__(self, name: str, physical, metadata: Dict = None):
+        self.name = name
+        self.physical = physical
+        self.view_metadata = dict(metadata or {})
+
+    @property
+    def metadata(self) -> Dict:
+        merged = dict(self.physical.metadata or {})
+        merged.update(self.view_metadata)
+        merged['physical_index'] = self.physical.name
+        return merged
+
+    def __getattr__(self, attribute):
+        # Only called for attributes not defined on the view itself
+        return getattr(self.physical, attribute)
+
+    def __repr__(self) -> str:
+        return f"CollectionView(name={self.name!r}, physical={self.physical.name!r})"
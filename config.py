@@ -1,4 +1,11 @@
 LLM_MODEL_ID = "ibm-granite/granite-3.2-2b-instruct"
+# "auto" (checkpoint dtype, device_map='auto'), "bfloat16", or "int8" (dynamic int8 Linear layers, CPU)
+LLM_LOAD_MODE = "auto"
+# torch intra-op threads for CPU inference; None keeps torch's default
+LLM_NUM_THREADS = None
+# Weights are fetched here once; later loads read only this directory and need no network
+LLM_WEIGHTS_CACHE_DIR = "./model_cache"
+LLM_WARMUP_TOKENS = 8
 
 SIMILARITY_TOP_K = 5
 TEMPERATURE = 0.1
@@ -9,6 +16,65 @@ TOP_P = 1
 
 CHUNK_SIZE = 500
 
+# Print RAG answers token by token as the LLM generates them
+STREAM_RESPONSES = True
+# Run retrieval concurrently with query tokenization, and print per-stage timings for each request
+PARALLEL_RETRIEVAL = True
+SHOW_STAGE_TIMINGS = True
+# The search service batches RAG prompts from concurrent sessions into one generate() call
+GENERATION_MAX_BATCH_SIZE = 8
+GENERATION_MAX_WAIT_MS = 50
+# Answer from the search results alone when the top match is this strong and this far ahead...
+SHORT_CIRCUIT_SIMILARITY = 0.75
+SHORT_CIRCUIT_MARGIN = 0.15
+# ...or when generation is this backed up
+LLM_MAX_QUEUE_DEPTH = 32
+LLM_LATENCY_BUDGET_SECONDS = 15
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8080
+# Search requests arriving within this window are embedded and searched as one batch
+SERVICE_BATCH_WINDOW_MS = 5
+SERVICE_MAX_BATCH_SIZE = 32
+# Largest n a search request may ask for
+SERVICE_MAX_RESULTS = 50
+
+# Print time per import and init phase once an entry point is ready
+SHOW_STARTUP_PROFILE = True
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+VECTOR_STORE_PATH = "./chroma_db"
+# "chroma" for ChromaDB, "numpy" for the in-process NumpyVectorIndex
+VECTOR_BACKEND = "chroma"
+# Physical collection that the entry points' named views share
+SHARED_INDEX_NAME = "food_catalog"
+# Memory-map persisted NumPy indexes so worker processes share one page-cache copy
+NUMPY_INDEX_MMAP = True
+# None, "float16" or "int8"; quantized scores pick k * RERANK_FACTOR candidates for exact re-rank
+NUMPY_INDEX_QUANTIZATION = None
+NUMPY_INDEX_RERANK_FACTOR = 4
+SYNC_BATCH_SIZE = 256
+# Embedding batches run in INGEST_WORKERS threads while other batches are built and inserted
+INGEST_BATCH_SIZE = 64
+INGEST_WORKERS = 2
+
+QUERY_CACHE_MAX_ENTRIES = 1024
+QUERY_CACHE_MAX_BYTES = 16 * 1024 * 1024
+QUERY_CACHE_SPILL_DIR = None
+QUERY_CACHE_SPILL_MAX_BYTES = 256 * 1024 * 1024
+RESULT_CACHE_MAX_ENTRIES = 2048
+# Fuse BM25 over names, ingredients and taste profiles with vector ranks (reciprocal rank fusion);
+# single-keyword queries with enough BM25 hits are answered from BM25 alone without embedding the query
+HYBRID_SEARCH = True
+HYBRID_CANDIDATE_FACTOR = 4
+RRF_K = 60
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Generated RAG answers are reused for questions this similar that retrieved the same dishes
+RESPONSE_CACHE_MAX_ENTRIES = 512
+RESPONSE_CACHE_TTL_SECONDS = 3600
+RESPONSE_CACHE_SIMILARITY = 0.95
+
 USER_QUESTION_TEMPLATE = '''You are a helpful food recommendation assistant. A user is asking for food recommendations, and I've retrieved relevant options from a food database.
 User Query: "{query}"
 Retrieved Food Information:
@@ -20,4 +86,19 @@ Please provide a helpful, short response that:
 4. Includes relevant details like cuisine type, calories, or health benefits
 5. Uses a friendly, conversational tone
 6. Keeps the response concise but informative
-Response:'''
\ No newline at end of file
+Response:'''
+
+COMPARISON_TEMPLATE = '''You are analyzing and comparing two different food preference queries. Please provide a thoughtful comparison.
+Query 1: "{query1}"
+Top Results for Query 1:
+{context1}
+Query 2: "{query2}"
+Top Results for Query 2:
+{context2}
+Please provide a short comparison that:
+1. Highlights the key differences between these two food preferences
+2. Notes any similarities or overlaps
+3. Explains which query might be better for different situations
+4. Recommends the best option from each query
+5. Keeps the analysis concise but insightful
+Comparison:'''
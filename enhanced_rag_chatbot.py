@@ -1,34 +1,89 @@
-from huggingface_hub import login
-from dotenv import load_dotenv
-from transformers import AutoModelForCausalLM
-from llama_index.llms.huggingface import HuggingFaceLLM
 from shared_functions import *
+from startup_profile import print_startup_report, startup_phase, timed_import
+from stage_timing import RequestTimeline
+from answer_policy import answer_policy
+from llm_generation import (complete_rag_prompt, complete_template_prompt, get_template_tokens,
+                            stream_rag_prompt, warm_prompt_prefixes)
 
 import os
+import time
+from model_registry import current_rss_bytes, model_parameter_bytes
+from concurrent.futures import ThreadPoolExecutor
 import config
 
-load_dotenv()
+# huggingface_hub, transformers, llama_index and dotenv are imported on first
+# use so that importing this module (e.g. from system_comparison) stays cheap
+
+# Runs retrieval alongside prompt preparation when config.PARALLEL_RETRIEVAL is on
+stage_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rag-stage")
+
+# Filled by create_hf_LLM and reported by warm_up_llm
+llm_load_stats: Dict = {}
+
+def local_llm_weights(model_id: str = config.LLM_MODEL_ID) -> Optional[str]:
+    """Path of a complete local copy of the model, or None if it has not been fetched yet"""
+    try:
+        return timed_import("huggingface_hub").snapshot_download(
+            model_id, cache_dir=config.LLM_WEIGHTS_CACHE_DIR, local_files_only=True
+        )
+    except Exception:
+        return None
 
 def hf_login():
+    # Cached weights load without the Hub, so no token is needed
+    if local_llm_weights() is not None:
+        return
+    timed_import("dotenv").load_dotenv()
     token = os.getenv("HUGGINGFACE_HUB_TOKEN")
     if not token:
         raise RuntimeError("HUGGINGFACE_HUB_TOKEN not set")
-    login(token=token)
+    timed_import("huggingface_hub").login(token=token)
 
 def create_hf_LLM(
     temperature: float = config.TEMPERATURE,
     max_new_tokens: int = config.MAX_NEW_TOKENS,
     decoding_method: str = "sample",
 ):
-    model = AutoModelForCausalLM.from_pretrained(
-        config.LLM_MODEL_ID,
-        device_map='auto',
-        dtype='auto'
-    )
+    torch = timed_import("torch")
+    AutoModelForCausalLM = timed_import("transformers").AutoModelForCausalLM
+    HuggingFaceLLM = timed_import("llama_index.llms.huggingface").HuggingFaceLLM
+
+    if config.LLM_NUM_THREADS:
+        torch.set_num_threads(config.LLM_NUM_THREADS)
+
+    weights_path = local_llm_weights()
+    if weights_path is None:
+        with startup_phase("download LLM weights"):
+            weights_path = timed_import("huggingface_hub").snapshot_download(
+                config.LLM_MODEL_ID, cache_dir=config.LLM_WEIGHTS_CACHE_DIR
+            )
+
+    rss_before = current_rss_bytes()
+    started = time.perf_counter()
+    with startup_phase(f"load LLM weights ({config.LLM_LOAD_MODE})"):
+        if config.LLM_LOAD_MODE == "bfloat16":
+            model = AutoModelForCausalLM.from_pretrained(weights_path, dtype=torch.bfloat16)
+        elif config.LLM_LOAD_MODE == "int8":
+            model = AutoModelForCausalLM.from_pretrained(weights_path, dtype=torch.float32)
+            # Linear weights become int8; activations are quantized on the fly per batch
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        else:
+            model = AutoModelForCausalLM.from_pretrained(
+                weights_path,
+                device_map='auto',
+                dtype='auto'
+            )
+        model.eval()
+    rss_after = current_rss_bytes()
+    llm_load_stats.update({
+        "mode": config.LLM_LOAD_MODE,
+        "load_seconds": time.perf_counter() - started,
+        "rss_delta_bytes": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+    })
     try:
         llm = HuggingFaceLLM(
             model_name=config.LLM_MODEL_ID,
-            tokenizer_name=config.LLM_MODEL_ID,
+            tokenizer_name=weights_path,
             max_new_tokens=max_new_tokens,
             model=model,
             messages_to_prompt=None,
@@ -46,6 +101,45 @@ def create_hf_LLM(
     except Exception as e:
         print(f"Failed to create HuggingFace LLM: {e}")
         return None
+
+def warm_up_llm(llm, max_new_tokens: int = config.LLM_WARMUP_TOKENS) -> Optional[Dict]:
+    """Run a short greedy generation and report load time, memory and tokens/sec"""
+    started = time.perf_counter()
+    try:
+        if getattr(llm, "_model", None) is not None and getattr(llm, "_tokenizer", None) is not None:
+            tokenizer = llm._tokenizer
+            inputs = tokenizer("Hello", return_tensors="pt").to(llm._model.device)
+            output = llm._model.generate(
+                **inputs, max_new_tokens=max_new_tokens, do_sample=False,
+                pad_token_id=tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id,
+            )
+            new_tokens = output.shape[1] - inputs["input_ids"].shape[1]
+        else:
+            if not llm.complete("Hello"):
+                return None
+            new_tokens = None
+    except Exception as e:
+        print(f"❌ LLM warm-up failed: {e}")
+        return None
+
+    elapsed = time.perf_counter() - started
+    stats = dict(llm_load_stats)
+    stats.update({
+        "warmup_seconds": elapsed,
+        "tokens_per_second": new_tokens / elapsed if new_tokens else None,
+        "parameter_bytes": model_parameter_bytes(llm),
+        "rss_bytes": current_rss_bytes(),
+    })
+
+    details = [f"{stats['mode']} weights" if "mode" in stats else "LLM"]
+    if stats.get("load_seconds") is not None:
+        details.append(f"loaded in {stats['load_seconds']:.1f}s")
+    if stats["rss_bytes"] is not None:
+        details.append(f"process RSS {stats['rss_bytes'] / 2**20:.0f} MB")
+    if stats["tokens_per_second"] is not None:
+        details.append(f"{stats['tokens_per_second']:.1f} tokens/s")
+    print(f"🔥 LLM warm-up: {', '.join(details)}")
+    return stats
     
 def main():
     """Main function for enhanced RAG chatbot system"""
@@ -56,23 +150,35 @@ def main():
         
         # Load food data
         global food_items
-        food_items = load_food_data('./FoodDataSet.json')
+        with startup_phase("load food catalog"):
+            food_items = load_food_data('./FoodDataSet.json')
         print(f"✅ Loaded {len(food_items)} food items")
         
         # Create collection for RAG system
-        collection = create_similarity_search_collection(
+        collection = create_similarity_search_view(
             "enhanced_rag_food_chatbot",
             {'description': 'Enhanced RAG chatbot with IBM watsonx.ai integration'}
         )
-        populate_similarity_collection(collection, food_items)
-        print("✅ Vector database ready")
-        
+
+        def populate():
+            with startup_phase("populate vector index"):
+                populate_similarity_collection(collection, food_items)
+
+        # Indexing and LLM loading are independent, so the index is built while the weights load
+        indexing = stage_executor.submit(populate)
+
         hf_login()
         model = create_hf_LLM()
         # Test LLM connection
         print("🔗 Testing LLM connection...")
 
-        test_response = model.complete("Hello")
+        with startup_phase("LLM warm-up"):
+            test_response = warm_up_llm(model)
+        with startup_phase("prefill prompt template prefixes"):
+            warm_prompt_prefixes(model)
+
+        indexing.result()
+        print("✅ Vector database ready")
 
         if test_response:
             print("✅ LLM connection established")
@@ -80,6 +186,7 @@ def main():
             print("❌ LLM connection failed")
             return
         
+        print_startup_report()
         enhanced_rag_food_chatbot(collection, model)
 
     except Exception as error:
@@ -165,7 +272,7 @@ def prepare_context_for_llm(query: str, search_results: List[Dict]) -> str:
         if result.get('food_health_benefits'):
             food_context.append(f"  - Health benefits: {result['food_health_benefits']}")
         
-        if result.get('cooking_method'):
+        if describe_cooking_method(result.get('cooking_method')):
             food_context.append(f"  - Cooking method: {result['cooking_method']}")
         
         if result.get('taste_profile'):
@@ -178,24 +285,19 @@ def prepare_context_for_llm(query: str, search_results: List[Dict]) -> str:
     
     return "\n".join(context_parts)
 
-def generate_llm_rag_response(query: str, search_results: List[Dict], model) -> str:
+def generate_llm_rag_response(query: str, search_results: List[Dict], model,
+                              query_ids: Optional[List[int]] = None) -> str:
     """Generate response using IBM Granite with retrieved context"""
     try:
         # Prepare context from search results
         context = prepare_context_for_llm(query, search_results)
         
-        # Build the prompt for the LLM
-        prompt = config.USER_QUESTION_TEMPLATE.format(
-            query=query,
-            context=context
-        )
-
-        response = model.complete(prompt)
+        # Fill the pre-tokenized prompt template and generate
+        response_text = complete_rag_prompt(model, query, context, query_ids)
 
-
-        if response:            
+        if response_text:
             # Clean up the response if needed
-            response_text = response.text.strip()
+            response_text = response_text.strip()
             
             # If response is too short, provide a fallback
             if len(response_text) < 50:
@@ -209,8 +311,88 @@ def generate_llm_rag_response(query: str, search_results: List[Dict], model) ->
         print(f"❌ LLM Error: {e}")
         return
 
+def stream_llm_rag_response(query: str, search_results: List[Dict], model,
+                            query_ids: Optional[List[int]] = None) -> Iterator[str]:
+    """Yield the RAG response piece by piece as IBM Granite generates it"""
+    context = prepare_context_for_llm(query, search_results)
+    yield from stream_rag_prompt(model, query, context, query_ids)
+
+def print_streamed_rag_response(query: str, search_results: List[Dict], model,
+                                query_ids: Optional[List[int]] = None) -> str:
+    """Print the RAG response as it is generated and report time-to-first-token"""
+    started = time.perf_counter()
+    first_token_at = None
+    pieces = []
+
+    print("\n🤖 Bot: ", end="", flush=True)
+    try:
+        for token in stream_llm_rag_response(query, search_results, model, query_ids):
+            if not pieces:
+                token = token.lstrip()
+                if not token:
+                    continue
+                first_token_at = time.perf_counter()
+            pieces.append(token)
+            print(token, end="", flush=True)
+    except Exception as e:
+        print(f"\n❌ LLM Error: {e}")
+
+    response_text = "".join(pieces).strip()
+    if len(response_text) < 50:
+        # Too little came through to stand on its own, so follow up with the template answer
+        response_text = generate_fallback_response(query, search_results)
+        print(("\n" if pieces else "") + response_text, end="")
+    print()
+
+    total = time.perf_counter() - started
+    if first_token_at is not None:
+        print(f"⏱️ First token after {first_token_at - started:.2f}s, full response in {total:.2f}s")
+    return response_text
+
+# Cooking methods that read badly after "Preparation:"
+COOKING_METHOD_PHRASES = {
+    "manufacturing": "commercially made",
+    "no-bake": "no baking needed",
+}
+MISSING_VALUES = {"", "none", "null", "n/a", "unknown"}
+
+def describe_cooking_method(cooking_method) -> Optional[str]:
+    """A readable phrase for a cooking method, or None if the catalog does not really give one"""
+    method = str(cooking_method or "").strip().lower()
+    if method in MISSING_VALUES:
+        return None
+    return COOKING_METHOD_PHRASES.get(method, method)
+
+def describe_features(features: Dict) -> Optional[str]:
+    """One sentence on a dish's taste, texture, look and serving temperature, e.g.
+    "It tastes sweet, has a crisp and tender texture, looks golden brown and is best served hot."
+    """
+    features = {
+        key: str(value).strip() for key, value in (features or {}).items()
+        if str(value or "").strip().lower() not in MISSING_VALUES
+    }
+    clauses = []
+    if features.get("taste"):
+        clauses.append(f"tastes {features['taste']}")
+    if features.get("texture"):
+        clauses.append(f"has a {features['texture']} texture")
+    if features.get("appearance"):
+        clauses.append(f"looks {features['appearance']}")
+    serving = features.get("serving_type", "").lower()
+    if serving:
+        clauses.append(f"is best served {'at ' if serving == 'room temperature' else ''}{serving}")
+    if not clauses:
+        return None
+    sentence = clauses[0] if len(clauses) == 1 else ", ".join(clauses[:-1]) + " and " + clauses[-1]
+    return f"It {sentence}."
+
+def format_ingredients(ingredients, limit: int = 5) -> str:
+    if isinstance(ingredients, list):
+        return ', '.join(ingredients[:limit])
+    return str(ingredients or '')
+
 def generate_fallback_response(query: str, search_results: List[Dict]) -> str:
-    """Generate fallback response when LLM fails"""
+    """Generate a template response from the search results when the LLM fails or is skipped"""
     if not search_results:
         return "I couldn't find any food items matching your request. Try describing what you're in the mood for with different words!"
     
@@ -218,11 +400,31 @@ def generate_fallback_response(query: str, search_results: List[Dict]) -> str:
     response_parts = []
     
     response_parts.append(f"Based on your request for '{query}', I'd recommend {top_result['food_name']}.")
-    response_parts.append(f"It's a {top_result['cuisine_type']} dish with {top_result['food_calories_per_serving']} calories per serving.")
+    article = "an" if str(top_result['cuisine_type'])[:1].lower() in ("a", "e", "i", "o", "u") else "a"
+    response_parts.append(f"It's {article} {top_result['cuisine_type']} dish with {top_result['food_calories_per_serving']} calories per serving.")
     
-    if len(search_results) > 1:
-        second_choice = search_results[1]
-        response_parts.append(f"Another great option would be {second_choice['food_name']}.")
+    # Use whatever richer metadata the search returned for the top dish
+    if top_result.get('food_description'):
+        response_parts.append(top_result['food_description'].rstrip('.') + '.')
+    if top_result.get('food_ingredients'):
+        response_parts.append(f"Key ingredients: {format_ingredients(top_result['food_ingredients'])}.")
+    cooking_method = describe_cooking_method(top_result.get('cooking_method'))
+    if cooking_method:
+        response_parts.append(f"Preparation: {cooking_method}.")
+    features = describe_features(top_result.get('food_features'))
+    if features:
+        response_parts.append(features)
+    if str(top_result.get('food_health_benefits') or '').strip().lower() not in MISSING_VALUES:
+        response_parts.append(f"Health benefits: {top_result['food_health_benefits']}.")
+    
+    for other_choice in search_results[1:3]:
+        option = (f"Another great option would be {other_choice['food_name']} "
+                  f"({other_choice['cuisine_type']}, {other_choice['food_calories_per_serving']} calories)")
+        if other_choice.get('food_description'):
+            option += f": {other_choice['food_description'].rstrip('.')}"
+        elif other_choice.get('food_ingredients'):
+            option += f", made with {format_ingredients(other_choice['food_ingredients'], 3)}"
+        response_parts.append(option + ".")
     
     return " ".join(response_parts)
 
@@ -255,9 +457,24 @@ def show_enhanced_rag_help():
 def handle_enhanced_rag_query(collection, query: str, conversation_history: List[str], model):
     """Handle user query with enhanced RAG approach using IBM Granite"""
     print(f"\n🔍 Searching vector database for: '{query}'...")
-    
-    # Perform similarity search with more results for better context
-    search_results = perform_similarity_search(collection, query, 3)
+    timeline = RequestTimeline()
+    template_tokens = get_template_tokens(model)
+    query_ids = None
+
+    # Perform similarity search with more results for better context, fetching every field the prompt uses
+    if config.PARALLEL_RETRIEVAL:
+        # The query's tokens do not depend on the search results, so encode them while searching
+        retrieval = stage_executor.submit(
+            timeline.run, "vector search", perform_similarity_search, collection, query, 3, RAG_RESULT_FIELDS
+        )
+        if template_tokens is not None:
+            with timeline.stage("tokenize query"):
+                query_ids = template_tokens.encode_text(query)
+        search_results = retrieval.result()
+    else:
+        search_results = timeline.run(
+            "vector search", perform_similarity_search, collection, query, 3, RAG_RESULT_FIELDS
+        )
     
     if not search_results:
         print("🤖 Bot: I couldn't find any food items matching your request.")
@@ -265,12 +482,35 @@ def handle_enhanced_rag_query(collection, query: str, conversation_history: List
         return
     
     print(f"✅ Found {len(search_results)} relevant matches")
-    print("🧠 Generating AI-powered response...")
-    
-    # Generate enhanced RAG response using IBM Granite
-    ai_response = generate_llm_rag_response(query, search_results, model)
-    
-    print(f"\n🤖 Bot: {ai_response}")
+
+    # A near-identical question that retrieved the same dishes has already been answered
+    query_embedding, cached_response = timeline.run(
+        "response cache lookup", get_cached_rag_response, collection, query, search_results
+    )
+    skip_reason = None if cached_response is not None else answer_policy.decide(search_results)
+    if cached_response is not None:
+        print(f"\n🤖 Bot: {cached_response}")
+        print("♻️ Answered from the response cache")
+    elif skip_reason is not None:
+        print(f"\n🤖 Bot: {generate_fallback_response(query, search_results)}")
+        print(f"⚡ Quick answer from search results (degraded: {skip_reason})")
+    else:
+        print("🧠 Generating AI-powered response...")
+
+        # Generate enhanced RAG response using IBM Granite
+        started = time.perf_counter()
+        with timeline.stage("build context + generate"):
+            if config.STREAM_RESPONSES:
+                ai_response = print_streamed_rag_response(query, search_results, model, query_ids)
+            else:
+                ai_response = generate_llm_rag_response(query, search_results, model, query_ids)
+                print(f"\n🤖 Bot: {ai_response}")
+                print(f"⏱️ Full response in {time.perf_counter() - started:.2f}s")
+        answer_policy.observe_generation(time.perf_counter() - started)
+
+        # Template answers stand in for a failed generation and are not worth keeping
+        if ai_response != generate_fallback_response(query, search_results):
+            store_rag_response(collection, query_embedding, search_results, ai_response)
     
     # Show detailed results for reference
     print(f"\n📊 Search Results Details:")
@@ -280,6 +520,7 @@ def handle_enhanced_rag_query(collection, query: str, conversation_history: List
         print(f"   📍 {result['cuisine_type']} | 🔥 {result['food_calories_per_serving']} cal | 📈 {result['similarity_score']*100:.1f}% match")
         if i < 3:
             print()
+    timeline.report("RAG query stages")
 
 def handle_enhanced_comparison_mode(collection, model):
     """Enhanced comparison between two food queries using LLM"""
@@ -295,15 +536,20 @@ def handle_enhanced_comparison_mode(collection, model):
         return
     
     print(f"\n🔍 Analyzing '{query1}' vs '{query2}' with AI...")
+    timeline = RequestTimeline()
     
-    # Get results for both queries
-    results1 = perform_similarity_search(collection, query1, 3)
-    results2 = perform_similarity_search(collection, query2, 3)
+    # Both retrievals run at once: one embedding pass and one index query for the pair
+    with timeline.stage("vector search (both queries)"):
+        results1, results2 = perform_batch_similarity_search(
+            collection, [query1, query2], n_results=3, fields=RAG_RESULT_FIELDS
+        )
     
     # Generate AI-powered comparison
-    comparison_response = generate_llm_comparison(query1, query2, results1, results2, model)
+    with timeline.stage("build context + generate"):
+        comparison_response = generate_llm_comparison(query1, query2, results1, results2, model)
     
     print(f"\n🤖 AI Analysis: {comparison_response}")
+    timeline.report("Comparison stages")
     
     # Show side-by-side results
     print(f"\n📊 DETAILED COMPARISON")
@@ -323,25 +569,14 @@ def generate_llm_comparison(query1: str, query2: str, results1: List[Dict], resu
         context1 = prepare_context_for_llm(query1, results1[:3])
         context2 = prepare_context_for_llm(query2, results2[:3])
         
-        comparison_prompt = f'''You are analyzing and comparing two different food preference queries. Please provide a thoughtful comparison.
-Query 1: "{query1}"
-Top Results for Query 1:
-{context1}
-Query 2: "{query2}"
-Top Results for Query 2:
-{context2}
-Please provide a short comparison that:
-1. Highlights the key differences between these two food preferences
-2. Notes any similarities or overlaps
-3. Explains which query might be better for different situations
-4. Recommends the best option from each query
-5. Keeps the analysis concise but insightful
-Comparison:'''
-
-        generated_response = model.complete(comparison_prompt)
+        # The fixed preamble of COMPARISON_TEMPLATE is prefilled once, so only the queries and contexts are encoded here
+        generated_response = complete_template_prompt(
+            model, config.COMPARISON_TEMPLATE,
+            query1=query1, context1=context1, query2=query2, context2=context2
+        )
         
         if generated_response:
-            return generated_response.text.strip()
+            return generated_response.strip()
         else:
             return generate_simple_comparison(query1, query2, results1, results2)
             
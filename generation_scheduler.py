@@ -0,0 +1,206 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Iterator, List, Optional
+
+import config
+from prefix_cache import get_prefix_cache
+from startup_profile import timed_import
+
+class GenerationRequest:
+    """One prompt waiting for a batch slot; streamed requests also get a token queue"""
+
+    def __init__(self, input_ids: List[int], stream: bool = False):
+        self.input_ids = input_ids
+        self.future: Future = Future()
+        self.tokens: Optional[queue.Queue] = queue.Queue() if stream else None
+
+class BatchTextStreamer:
+    """Fans the tokens of a batched generate() call out to each streamed request.
+
+    generate() first passes the prompt batch, then one new token per row per
+    step; rows that hit an end-of-sequence token keep receiving padding,
+    which is dropped here.
+    """
+
+    def __init__(self, tokenizer, requests: List[GenerationRequest], eos_ids: set):
+        self.tokenizer = tokenizer
+        self.requests = requests
+        self.eos_ids = eos_ids
+        self.generated: List[List[int]] = [[] for _ in requests]
+        self.emitted = ["" for _ in requests]
+        self.finished = [False for _ in requests]
+        self.prompt_seen = False
+
+    def put(self, value):
+        if not self.prompt_seen:
+            self.prompt_seen = True
+            return
+        for row, token in enumerate(value.reshape(-1).tolist()):
+            if self.finished[row]:
+                continue
+            if token in self.eos_ids:
+                self.finished[row] = True
+                continue
+            self.generated[row].append(token)
+            request = self.requests[row]
+            if request.tokens is None:
+                continue
+            text = self.tokenizer.decode(self.generated[row], skip_special_tokens=True)
+            # Hold back partial multi-byte characters until the next token completes them
+            if len(text) > len(self.emitted[row]) and not text.endswith("\ufffd"):
+                request.tokens.put(text[len(self.emitted[row]):])
+                self.emitted[row] = text
+
+    def end(self):
+        self.finished = [True for _ in self.requests]
+
+class GenerationScheduler:
+    """Collects prompts from concurrent sessions and runs them through the LLM as padded batches.
+
+    A batch starts once max_batch_size prompts are waiting or the oldest has
+    waited max_wait_ms; prompts that arrive while a batch is generating form
+    the next one. Prompts are left-padded so every row generates from the
+    same position.
+    """
+
+    def __init__(self, llm, max_batch_size: int = config.GENERATION_MAX_BATCH_SIZE,
+                 max_wait_ms: float = config.GENERATION_MAX_WAIT_MS):
+        self.llm = llm
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.pending: queue.Queue = queue.Queue()
+        self.batches = 0
+        self.requests = 0
+        self.generated_tokens = 0
+        self.generate_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name="generation-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, input_ids: List[int]) -> Future:
+        request = GenerationRequest(input_ids)
+        self.pending.put(request)
+        return request.future
+
+    def stream(self, input_ids: List[int]) -> Iterator[str]:
+        request = GenerationRequest(input_ids, stream=True)
+        self.pending.put(request)
+        while True:
+            text = request.tokens.get()
+            if text is None:
+                break
+            yield text
+        # Surfaces a generation error after whatever was streamed
+        request.future.result()
+
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._generate(batch)
+            except Exception as e:
+                # Whatever failed (building tensors, generate, decoding), this thread must keep serving
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                    if request.tokens is not None:
+                        request.tokens.put(None)
+
+    def _eos_ids(self) -> set:
+        eos_ids = {self.llm._tokenizer.eos_token_id}
+        configured = getattr(getattr(self.llm._model, "generation_config", None), "eos_token_id", None)
+        if isinstance(configured, (list, tuple)):
+            eos_ids.update(configured)
+        elif configured is not None:
+            eos_ids.add(configured)
+        eos_ids.discard(None)
+        return eos_ids
+
+    def _generate(self, batch: List[GenerationRequest]):
+        torch = timed_import("torch")
+        tokenizer = self.llm._tokenizer
+        eos_ids = self._eos_ids()
+        pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+        if pad_id is None:
+            raise ValueError("The tokenizer has no pad or end-of-sequence token to left-pad a batch with")
+
+        width = max(len(request.input_ids) for request in batch)
+        input_ids = torch.full((len(batch), width), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+        for row, request in enumerate(batch):
+            input_ids[row, width - len(request.input_ids):] = torch.tensor(request.input_ids)
+            attention_mask[row, width - len(request.input_ids):] = 1
+
+        streamer = None
+        if any(request.tokens is not None for request in batch):
+            streamer = BatchTextStreamer(tokenizer, batch, eos_ids)
+
+        extra_kwargs = {}
+        prefix_cache = get_prefix_cache(self.llm)
+        # Left padding shifts the shared preamble to a different position in each row,
+        # so a cached prefix only applies to an unpadded single-prompt batch
+        if len(batch) == 1 and prefix_cache is not None:
+            past_key_values = prefix_cache.lookup(batch[0].input_ids)
+            if past_key_values is not None:
+                extra_kwargs["past_key_values"] = past_key_values
+
+        started = time.perf_counter()
+        output = self.llm._model.generate(
+            input_ids=input_ids.to(self.llm._model.device),
+            attention_mask=attention_mask.to(self.llm._model.device),
+            max_new_tokens=self.llm.max_new_tokens,
+            pad_token_id=pad_id,
+            streamer=streamer,
+            **extra_kwargs,
+            **self.llm.generate_kwargs,
+        )
+
+        self.generate_seconds += time.perf_counter() - started
+        self.batches += 1
+        self.requests += len(batch)
+        for row, request in enumerate(batch):
+            new_tokens = output[row, width:].tolist()
+            for position, token in enumerate(new_tokens):
+                if token in eos_ids:
+                    new_tokens = new_tokens[:position]
+                    break
+            self.generated_tokens += len(new_tokens)
+            request.future.set_result(tokenizer.decode(new_tokens, skip_special_tokens=True))
+            if request.tokens is not None:
+                request.tokens.put(None)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "generated_tokens": self.generated_tokens,
+            "tokens_per_second": self.generated_tokens / self.generate_seconds if self.generate_seconds else 0.0,
+        }
+
+generation_schedulers: Dict[int, GenerationScheduler] = {}
+
+def start_generation_scheduler(llm, **options) -> Optional[GenerationScheduler]:
+    """Route every generation for this LLM through a shared batching scheduler.
+
+    Only HuggingFace LLMs with a local model and tokenizer can be batched;
+    others keep generating one prompt at a time and None is returned.
+    """
+    if getattr(llm, "_model", None) is None or getattr(llm, "_tokenizer", None) is None:
+        return None
+    if id(llm) not in generation_schedulers:
+        generation_schedulers[id(llm)] = GenerationScheduler(llm, **options)
+    return generation_schedulers[id(llm)]
+
+def get_generation_scheduler(llm) -> Optional[GenerationScheduler]:
+    return generation_schedulers.get(id(llm))
@@ -0,0 +1,78 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+RecordBatch = Tuple[List[str], List[str], List[Dict], int]
+
+class IngestProgress:
+    """Track documents processed and print throughput and ETA"""
+
+    def __init__(self, total: Optional[int] = None, label: str = "Indexing"):
+        self.total = total
+        self.label = label
+        self.done = 0
+        self.embedded = 0
+        self.started = time.perf_counter()
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def update(self, processed: int, embedded: int):
+        self.done += processed
+        self.embedded += embedded
+        if not embedded:
+            # Batches served entirely from stored embeddings are not worth a progress line
+            return
+        rate = self.rate()
+        if self.total:
+            remaining = max(self.total - self.done, 0)
+            eta = f", ETA {remaining / rate:.1f}s" if rate > 0 else ""
+            print(f"   ⏳ {self.label}: {self.done}/{self.total} docs ({rate:.1f} docs/s{eta})")
+        else:
+            print(f"   ⏳ {self.label}: {self.done} docs ({rate:.1f} docs/s)")
+
+def run_embedding_pipeline(collection, record_batches: Iterable[RecordBatch], embedding_function,
+                           workers: int = 2, progress: IngestProgress = None,
+                           applied_ids: List[str] = None) -> int:
+    """Embed and upsert record batches with embedding overlapped across worker threads.
+
+    record_batches yields (ids, documents, metadatas, items_in_batch); only the
+    given records are embedded, while items_in_batch also counts skipped ones
+    for progress. Building the next batch, embedding in the pool and upserting
+    finished batches (in order) all overlap. Returns the number of documents embedded.
+    Ids are appended to applied_ids as their batch is upserted, so a caller
+    knows what changed even if a later batch fails.
+    """
+    workers = max(1, workers)
+    embedded = 0
+    in_flight = deque()
+
+    def flush_oldest():
+        nonlocal embedded
+        ids, documents, metadatas, items_in_batch, future = in_flight.popleft()
+        if future is not None:
+            collection.upsert(
+                ids=ids,
+                documents=documents,
+                metadatas=metadatas,
+                embeddings=future.result()
+            )
+            embedded += len(ids)
+            if applied_ids is not None:
+                applied_ids.extend(ids)
+        if progress:
+            progress.update(items_in_batch, len(ids))
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as pool:
+        for ids, documents, metadatas, items_in_batch in record_batches:
+            future = pool.submit(embedding_function, documents) if ids else None
+            in_flight.append((ids, documents, metadatas, items_in_batch, future))
+            # Bound memory: keep at most two batches per worker in flight
+            while len(in_flight) > workers * 2:
+                flush_oldest()
+        while in_flight:
+            flush_oldest()
+
+    return embedded
@@ -1,4 +1,6 @@
 from shared_functions import *
+from search_results import format_similarity
+from startup_profile import print_startup_report, startup_phase
 
 food_items = []
 search_history = []
@@ -11,14 +13,17 @@ def main():
 
         global food_items
         global search_history
-        food_items = load_food_data('./FoodDataSet.json')
+        with startup_phase("load food catalog"):
+            food_items = load_food_data('./FoodDataSet.json')
         print(f"✅ Loaded {len(food_items)} food items successfully")
 
-        collection = create_similarity_search_collection(
+        collection = create_similarity_search_view(
             "interactive_food_search",
             {'description': 'A collection for interactive food search'}
         )
-        populate_similarity_collection(collection, food_items)
+        with startup_phase("populate vector index"):
+            populate_similarity_collection(collection, food_items)
+        print_startup_report()
         
         # Start interactive chatbot
         interactive_food_chatbot(collection)
@@ -32,6 +37,7 @@ def interactive_food_chatbot(collection):
     print("Commands:")
     print("  • Type any food name or description to search")
     print("  • 'help' - Show available commands")
+    print("  • 'reload' - Sync catalog changes from the dataset file")
     print("  • 'quit' or 'exit' - Exit the system")
     print("  • Ctrl+C - Emergency exit")
     print("-" * 50)
@@ -55,6 +61,9 @@ def interactive_food_chatbot(collection):
             elif user_input.lower() in ['history']:
                 handle_history_command()
 
+            elif user_input.lower() in ['reload']:
+                sync_catalog(collection, './FoodDataSet.json')
+
             else:
                 handle_food_search(collection, user_input)
         
@@ -76,6 +85,7 @@ def show_help_menu():
     print("  • 'low calorie' - Find lower-calorie options")
     print("\nCommands:")
     print("  • 'help' - Show this help menu")
+    print("  • 'reload' - Sync catalog changes from the dataset file")
     print("  • 'quit' - Exit the system")
 
 def handle_food_search(collection, query):
@@ -98,11 +108,8 @@ def handle_food_search(collection, query):
     print("=" * 60)
 
     for i, result in enumerate(results, 1):
-        # Calculate percentage score
-        percentage_score = result['similarity_score'] * 100
-        
         print(f"\n{i}. 🍽️  {result['food_name']}")
-        print(f"   📊 Match Score: {percentage_score:.1f}%")
+        print(f"   📊 Match Score: {format_similarity(result)}")
         print(f"   🏷️  Cuisine: {result['cuisine_type']}")
         print(f"   🔥 Calories: {result['food_calories_per_serving']} per serving")
         print(f"   📝 Description: {result['food_description']}")
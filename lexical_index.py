@@ -0,0 +1,98 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import config
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "any", "are", "for", "i", "in", "is", "it", "me", "my", "of", "on",
+    "or", "some", "something", "that", "the", "to", "want", "with", "food", "dish", "dishes",
+}
+
+def stem(token: str) -> str:
+    """Fold simple English plurals so 'cherries' matches 'cherry' and 'peaches' matches 'peach'"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith(("ches", "shes", "xes", "oes")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def tokenize(text: str) -> List[str]:
+    return [stem(token) for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def is_keyword_query(query: str) -> bool:
+    """A single content word, e.g. 'chocolate' or 'cinnamon'"""
+    return len(tokenize(query)) == 1
+
+class BM25Index:
+    """Okapi BM25 inverted index over the name, ingredients and taste profile of each food item"""
+
+    def __init__(self, k1: float = config.BM25_K1, b: float = config.BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_terms: Dict[str, Tuple[str, ...]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+    def add(self, doc_id: str, text: str):
+        terms = tokenize(text)
+        counts = Counter(terms)
+        with self._lock:
+            self._remove(doc_id)
+            for term, frequency in counts.items():
+                self.postings.setdefault(term, {})[doc_id] = frequency
+            self.doc_terms[doc_id] = tuple(counts)
+            self.doc_lengths[doc_id] = len(terms)
+            self.total_length += len(terms)
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: str):
+        for term in self.doc_terms.pop(doc_id, ()):
+            postings = self.postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id, 0)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def search(self, query: str, n_results: int,
+               candidate_ids: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """Top (doc_id, score) pairs for the query, optionally only among candidate_ids"""
+        with self._lock:
+            if not self.doc_lengths:
+                return []
+            document_count = len(self.doc_lengths)
+            average_length = self.total_length / document_count or 1.0
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    if candidate_ids is not None and doc_id not in candidate_ids:
+                        continue
+                    length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + length_norm)
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = config.RRF_K) -> List[str]:
+    """Merge ranked id lists by summing 1 / (k + rank); ties keep the order of the first ranking"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda doc_id: scores[doc_id], reverse=True)
@@ -0,0 +1,132 @@
+import string
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import config
+from generation_scheduler import get_generation_scheduler
+from prefix_cache import get_prefix_cache, warm_prefix_cache
+from startup_profile import timed_import
+
+class TemplateTokens:
+    """A prompt template whose static text is tokenized once.
+
+    Only the field values (query, context) are tokenized per request, and a
+    field can be passed already tokenized so that work can run alongside
+    retrieval. Token ids are joined at field boundaries, which can split a
+    merge the tokenizer would make across the whole string; the template's
+    fields sit next to quotes and newlines, where that does not happen.
+    """
+
+    def __init__(self, tokenizer, template: str):
+        self.tokenizer = tokenizer
+        self.literals: List[List[int]] = []
+        self.fields: List[Optional[str]] = []
+        for literal, field, _, _ in string.Formatter().parse(template):
+            self.literals.append(self.encode_text(literal))
+            self.fields.append(field)
+        # Special tokens (e.g. BOS) the tokenizer adds in front of a full prompt
+        self.prefix = list(tokenizer("")["input_ids"])
+
+    @property
+    def static_prefix(self) -> List[int]:
+        """Tokens before the first field, identical for every request"""
+        return self.prefix + self.literals[0]
+
+    def encode_text(self, text: str) -> List[int]:
+        return list(self.tokenizer.encode(text, add_special_tokens=False)) if text else []
+
+    def encode(self, **values: Union[str, List[int]]) -> List[int]:
+        ids = list(self.prefix)
+        for literal, field in zip(self.literals, self.fields):
+            ids += literal
+            if field is not None:
+                value = values[field]
+                ids += self.encode_text(value) if isinstance(value, str) else value
+        return ids
+
+template_tokens: Dict[Tuple[str, str], TemplateTokens] = {}
+
+def get_template_tokens(llm, template: str = config.USER_QUESTION_TEMPLATE) -> Optional[TemplateTokens]:
+    """Pre-tokenized template for a HuggingFace LLM, or None for LLMs without a local tokenizer"""
+    tokenizer = getattr(llm, "_tokenizer", None)
+    if tokenizer is None or getattr(llm, "_model", None) is None:
+        return None
+    key = (getattr(tokenizer, "name_or_path", str(id(tokenizer))), template)
+    if key not in template_tokens:
+        template_tokens[key] = TemplateTokens(tokenizer, template)
+    return template_tokens[key]
+
+def warm_prompt_prefixes(llm, templates: Tuple[str, ...] = (config.USER_QUESTION_TEMPLATE,
+                                                              config.COMPARISON_TEMPLATE)):
+    """Tokenize each template and prefill the KV cache for its fixed preamble"""
+    tokens = [get_template_tokens(llm, template) for template in templates]
+    if any(template is None for template in tokens):
+        return None
+    return warm_prefix_cache(llm, [template.static_prefix for template in tokens])
+
+def generation_kwargs(llm, input_ids: List[int]) -> Dict:
+    torch = timed_import("torch")
+    inputs = torch.tensor([input_ids], device=llm._model.device)
+    tokenizer = llm._tokenizer
+    kwargs = {
+        "input_ids": inputs,
+        "attention_mask": torch.ones_like(inputs),
+        "max_new_tokens": llm.max_new_tokens,
+        "pad_token_id": tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id,
+        **llm.generate_kwargs,
+    }
+    prefix_cache = get_prefix_cache(llm)
+    past_key_values = prefix_cache.lookup(input_ids) if prefix_cache is not None else None
+    if past_key_values is not None:
+        # generate() skips the cached positions and prefills only the rest of the prompt
+        kwargs["past_key_values"] = past_key_values
+    return kwargs
+
+def generate_from_ids(llm, input_ids: List[int]) -> str:
+    """Run generation on an already tokenized prompt and decode only the new tokens"""
+    scheduler = get_generation_scheduler(llm)
+    if scheduler is not None:
+        return scheduler.submit(input_ids).result()
+    output = llm._model.generate(**generation_kwargs(llm, input_ids))
+    return llm._tokenizer.decode(output[0, len(input_ids):], skip_special_tokens=True)
+
+def stream_from_ids(llm, input_ids: List[int]) -> Iterator[str]:
+    """Like generate_from_ids, but yield decoded text as each token is produced"""
+    scheduler = get_generation_scheduler(llm)
+    if scheduler is not None:
+        yield from scheduler.stream(input_ids)
+        return
+    streamer = timed_import("transformers").TextIteratorStreamer(
+        llm._tokenizer, skip_prompt=True, skip_special_tokens=True
+    )
+    kwargs = generation_kwargs(llm, input_ids)
+    kwargs["streamer"] = streamer
+    thread = threading.Thread(target=llm._model.generate, kwargs=kwargs, daemon=True)
+    thread.start()
+    for text in streamer:
+        if text:
+            yield text
+    thread.join()
+
+def complete_template_prompt(llm, template: str, **values: Union[str, List[int]]) -> str:
+    """Generate from template filled with values; a value may be given as token ids"""
+    tokens = get_template_tokens(llm, template)
+    if tokens is None:
+        response = llm.complete(template.format(**values))
+        return response.text if response else ""
+    return generate_from_ids(llm, tokens.encode(**values))
+
+def complete_rag_prompt(llm, query: str, context: str, query_ids: Optional[List[int]] = None) -> str:
+    """Generate the answer to USER_QUESTION_TEMPLATE filled with query and context"""
+    # query_ids only exist when the LLM has a local tokenizer, i.e. when the template is tokenized
+    return complete_template_prompt(llm, config.USER_QUESTION_TEMPLATE, query=query_ids or query, context=context)
+
+def stream_rag_prompt(llm, query: str, context: str, query_ids: Optional[List[int]] = None) -> Iterator[str]:
+    """Streaming counterpart of complete_rag_prompt"""
+    tokens = get_template_tokens(llm)
+    if tokens is None:
+        for chunk in llm.stream_complete(config.USER_QUESTION_TEMPLATE.format(query=query, context=context)):
+            if chunk.delta:
+                yield chunk.delta
+        return
+    yield from stream_from_ids(llm, tokens.encode(query=query_ids or query, context=context))
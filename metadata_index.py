@@ -0,0 +1,212 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Union
+
+import numpy as np
+
+class CategoricalColumn(NamedTuple):
+    """A dictionary-encoded column: one int32 code per row into vocab"""
+    codes: np.ndarray
+    vocab: List
+
+    @classmethod
+    def from_values(cls, values: List) -> "CategoricalColumn":
+        code_of = {}
+        codes = np.asarray([code_of.setdefault(value, len(code_of)) for value in values], dtype=np.int32)
+        return cls(codes, list(code_of))
+
+    def vocab_array(self) -> np.ndarray:
+        vocab = np.empty(len(self.vocab), dtype=object)
+        vocab[:] = self.vocab
+        return vocab
+
+class ListColumn(NamedTuple):
+    """A list-valued column: row r holds codes[offsets[r]:offsets[r + 1]], each an index into vocab"""
+    offsets: np.ndarray
+    codes: np.ndarray
+    vocab: List
+
+    @classmethod
+    def from_values(cls, values: List) -> "ListColumn":
+        code_of = {}
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        codes = []
+        for row, items in enumerate(values):
+            # A missing value is an empty list; repeated items are stored once
+            row_codes = {code_of.setdefault(item, len(code_of)) for item in items or []}
+            codes.extend(sorted(row_codes))
+            offsets[row + 1] = len(codes)
+        return cls(offsets, np.asarray(codes, dtype=np.int32), list(code_of))
+
+    def rows(self) -> np.ndarray:
+        """The row each entry of codes belongs to"""
+        return np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int64), np.diff(self.offsets))
+
+    def contains_mask(self, item) -> np.ndarray:
+        """Boolean mask of the rows whose list includes item"""
+        mask = np.zeros(len(self.offsets) - 1, dtype=bool)
+        codes = [code for code, value in enumerate(self.vocab) if value == item]
+        mask[self.rows()[np.isin(self.codes, codes)]] = True
+        return mask
+
+Column = Union[np.ndarray, CategoricalColumn, ListColumn]
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def build_column(values: List) -> Column:
+    """Numeric values become a float64 array (NaN where missing), lists a list column, anything else categorical"""
+    if any(isinstance(value, list) for value in values):
+        return ListColumn.from_values(values)
+    if all(value is None or is_number(value) for value in values):
+        # Missing numbers become NaN, which fails every comparison
+        return np.asarray([np.nan if value is None else value for value in values], dtype=np.float64)
+    return CategoricalColumn.from_values(values)
+
+class MetadataIndex:
+    """Index over metadata columns that resolves filters to candidate row ids.
+
+    Columns come from column(field), either persisted arrays or built from
+    metadata rows on first use. String fields get a posting list per
+    dictionary code, list fields a posting list per item for $contains, and
+    numeric fields keep a sorted copy for range lookups. Lookups cost roughly the size of the matching set rather than the whole
+    catalog.
+    """
+
+    RANGE_OPERATORS = ("$lt", "$lte", "$gt", "$gte", "$eq")
+
+    def __init__(self, size: int, column: Callable[[str], Column]):
+        self.size = size
+        self._column = column
+        self._categorical: Dict[str, Optional[tuple]] = {}
+        self._sorted: Dict[str, Optional[tuple]] = {}
+        self._items: Dict[str, Optional[tuple]] = {}
+
+    def _categorical_field(self, field: str):
+        """Return (code_of, postings) for a string field, or None if it is numeric"""
+        if field not in self._categorical:
+            column = self._column(field)
+            if not isinstance(column, CategoricalColumn):
+                self._categorical[field] = None
+            else:
+                # A stable sort keeps each posting list in row order
+                order = np.argsort(column.codes, kind="stable").astype(np.int64)
+                counts = np.bincount(column.codes, minlength=len(column.vocab))
+                postings = np.split(order, np.cumsum(counts)[:-1]) if len(column.vocab) else []
+                code_of = {value: code for code, value in enumerate(column.vocab)}
+                self._categorical[field] = (code_of, postings)
+        return self._categorical[field]
+
+    def _list_field(self, field: str):
+        """Return (code_of, postings) over the items of a list field, or None if it is not list-valued"""
+        if field not in self._items:
+            column = self._column(field)
+            if not isinstance(column, ListColumn):
+                self._items[field] = None
+            else:
+                # Entries are in row order, so a stable sort keeps each posting list sorted
+                order = np.argsort(column.codes, kind="stable")
+                counts = np.bincount(column.codes, minlength=len(column.vocab))
+                postings = np.split(column.rows()[order], np.cumsum(counts)[:-1]) if len(column.vocab) else []
+                code_of = {item: code for code, item in enumerate(column.vocab)}
+                self._items[field] = (code_of, postings)
+        return self._items[field]
+
+    def _sorted_field(self, field: str):
+        """Return (rows ordered by value, sorted values) for a numeric field, or None if it is not numeric"""
+        if field not in self._sorted:
+            column = self._column(field)
+            if not isinstance(column, np.ndarray):
+                self._sorted[field] = None
+            else:
+                # Rows missing the field are left out, so they never match a range
+                rows = np.flatnonzero(~np.isnan(column))
+                rows = rows[np.argsort(column[rows], kind="stable")]
+                self._sorted[field] = (rows, np.asarray(column[rows]))
+        return self._sorted[field]
+
+    def _value_rows(self, field: str, wanted: List) -> Optional[np.ndarray]:
+        """Sorted rows whose field equals any of the wanted values"""
+        categorical = self._categorical_field(field)
+        if categorical is None:
+            column = self._column(field)
+            if not isinstance(column, np.ndarray):
+                return None
+            numbers = [value for value in wanted if is_number(value)]
+            return np.flatnonzero(np.isin(column, numbers)) if numbers else np.empty(0, dtype=np.int64)
+        code_of, postings = categorical
+        matched = [postings[code_of[item]] for item in wanted if item in code_of]
+        return np.unique(np.concatenate(matched)) if matched else np.empty(0, dtype=np.int64)
+
+    def _item_rows(self, field: str, item) -> Optional[np.ndarray]:
+        """Sorted rows whose list field includes item"""
+        list_field = self._list_field(field)
+        if list_field is None:
+            # Like Chroma, $contains never matches a scalar field
+            return np.empty(0, dtype=np.int64)
+        code_of, postings = list_field
+        return postings[code_of[item]] if item in code_of else np.empty(0, dtype=np.int64)
+
+    def _range_rows(self, field: str, op: str, value) -> Optional[np.ndarray]:
+        sorted_field = self._sorted_field(field)
+        if sorted_field is None or not isinstance(value, (int, float)):
+            return None
+        order, values = sorted_field
+        if op == "$lt":
+            rows = order[:np.searchsorted(values, value, side="left")]
+        elif op == "$lte":
+            rows = order[:np.searchsorted(values, value, side="right")]
+        elif op == "$gt":
+            rows = order[np.searchsorted(values, value, side="right"):]
+        elif op == "$gte":
+            rows = order[np.searchsorted(values, value, side="left"):]
+        else:
+            rows = order[np.searchsorted(values, value, side="left"):np.searchsorted(values, value, side="right")]
+        return np.sort(rows)
+
+    def _field_rows(self, field: str, condition) -> Optional[np.ndarray]:
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        row_sets = []
+        for op, value in condition.items():
+            if op in self.RANGE_OPERATORS and is_number(value):
+                rows = self._range_rows(field, op, value)
+            elif op in ("$eq", "$in") and isinstance(value, (str, list)):
+                rows = self._value_rows(field, value if isinstance(value, list) else [value])
+            elif op == "$contains":
+                rows = self._item_rows(field, value)
+            else:
+                rows = None
+            if rows is None:
+                return None
+            row_sets.append(rows)
+        return intersect_rows(row_sets)
+
+    def resolve(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Resolve a where clause to sorted candidate rows, or None if it cannot be indexed"""
+        if not where:
+            return None
+        row_sets = []
+        for field, condition in where.items():
+            if field == "$and":
+                rows = intersect_rows([self.resolve(clause) for clause in condition])
+            elif field == "$or":
+                parts = [self.resolve(clause) for clause in condition]
+                rows = None if any(part is None for part in parts) else np.unique(np.concatenate(parts))
+            else:
+                rows = self._field_rows(field, condition)
+            if rows is None:
+                return None
+            row_sets.append(rows)
+        return intersect_rows(row_sets)
+
+def intersect_rows(row_sets: List[Optional[np.ndarray]]) -> Optional[np.ndarray]:
+    """Intersect sorted row arrays, smallest first; None if any input is unresolved"""
+    if not row_sets or any(rows is None for rows in row_sets):
+        return None
+    row_sets = sorted(row_sets, key=len)
+    result = row_sets[0]
+    for rows in row_sets[1:]:
+        if len(result) == 0:
+            break
+        result = np.intersect1d(result, rows, assume_unique=True)
+    return result
@@ -0,0 +1,105 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from startup_profile import startup_phase, timed_import
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process, where the platform exposes it"""
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        # Peak rather than current RSS, but still shows the jump a model load causes
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, AttributeError):
+        return None
+
+def model_parameter_bytes(embedding_function) -> Optional[int]:
+    """Size of the loaded model's weights, if the embedding function exposes a torch model"""
+    model = getattr(embedding_function, "_model", None)
+    if model is None or not hasattr(model, "parameters"):
+        return None
+    return sum(parameter.numel() * parameter.element_size() for parameter in model.parameters())
+
+class EmbeddingModelRegistry:
+    """Process-wide registry that loads each embedding model once, on first use.
+
+    Safe to call from several threads: concurrent first requests for the same
+    model wait for a single load instead of each loading their own copy.
+    """
+
+    def __init__(self, factory: Callable = None):
+        self._factory = factory or (
+            lambda model_name: timed_import("chromadb.utils.embedding_functions")
+            .SentenceTransformerEmbeddingFunction(model_name=model_name)
+        )
+        self._functions = {}
+        self._lazy_chroma_functions = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name: str):
+        embedding_function = self._functions.get(model_name)
+        if embedding_function is not None:
+            return embedding_function
+
+        with self._lock:
+            if model_name not in self._functions:
+                rss_before = current_rss_bytes()
+                started = time.perf_counter()
+                with startup_phase(f"load embedding model {model_name}"):
+                    embedding_function = self._factory(model_name)
+                load_seconds = time.perf_counter() - started
+                rss_after = current_rss_bytes()
+
+                self._stats[model_name] = {
+                    "load_seconds": load_seconds,
+                    "parameter_bytes": model_parameter_bytes(embedding_function),
+                    "rss_delta_bytes": rss_after - rss_before
+                    if rss_before is not None and rss_after is not None else None,
+                }
+                self._functions[model_name] = embedding_function
+                print(f"Loaded embedding model {model_name} in {load_seconds:.2f}s")
+            return self._functions[model_name]
+
+    def lazy(self, model_name: str) -> Callable:
+        """A callable that only loads the model when it is first asked to embed something"""
+        return lambda texts: self.get(model_name)(texts)
+
+    def lazy_chroma_function(self, model_name: str):
+        """A Chroma-compatible sentence-transformer embedding function that defers loading.
+
+        It reports the same name and config as the real one, so persisted
+        collections accept it, but the model is only loaded on its first call.
+        """
+        if model_name not in self._lazy_chroma_functions:
+            base = timed_import("chromadb.utils.embedding_functions").SentenceTransformerEmbeddingFunction
+            registry = self
+
+            class LazySentenceTransformerEmbeddingFunction(base):
+                def __init__(self, model_name: str):
+                    self.model_name = model_name
+                    self.device = "cpu"
+                    self.normalize_embeddings = False
+                    self.kwargs = {}
+
+                def __call__(self, input):
+                    return registry.get(self.model_name)(input)
+
+            self._lazy_chroma_functions[model_name] = LazySentenceTransformerEmbeddingFunction(model_name)
+        return self._lazy_chroma_functions[model_name]
+
+    def is_loaded(self, model_name: str) -> bool:
+        return model_name in self._functions
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {model_name: dict(stats) for model_name, stats in self._stats.items()}
+
+embedding_model_registry = EmbeddingModelRegistry()
@@ -0,0 +1,539 @@
+import json
+import mmap
+import operator
+import os
+import threading
+from collections import deque
+from collections.abc import Sequence
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from metadata_index import CategoricalColumn, Column, ListColumn, MetadataIndex, build_column
+
+COMPARISON_OPERATORS = {
+    "$eq": operator.eq,
+    "$ne": operator.ne,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+}
+
+SCORING_CHUNK_ROWS = 8192
+
+# Metadata fields search filters use; persisted as columns so a loaded index never parses metadata rows to filter
+FILTER_COLUMNS = ("cuisine_type", "calories", "protein_g", "fat_g", "carbohydrates_g", "ingredient_list")
+
+MATRIX_FORMAT_VERSION = 3
+
+RECALL_PROBES = 64
+
+def quantize_embeddings(embeddings: np.ndarray, mode: str):
+    """Quantize a float32 matrix; returns (codes, per-dimension scale or None)"""
+    if mode == "float16":
+        return embeddings.astype(np.float16), None
+    if mode == "int8":
+        scale = np.abs(embeddings).max(axis=0) / 127.0 if len(embeddings) else np.ones(embeddings.shape[1])
+        scale = np.where(scale == 0, 1.0, scale).astype(np.float32)
+        codes = np.clip(np.rint(embeddings / scale), -127, 127).astype(np.int8)
+        return codes, scale
+    raise ValueError(f"Unsupported quantization mode: {mode}")
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row so a dot product is the cosine similarity"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+class MappedTexts(Sequence):
+    """Read-only strings stored back to back in one UTF-8 blob, addressed by a row offsets array.
+
+    The blob is usually a memory-mapped file, so worker processes share it
+    through the page cache and a row is decoded only when it is read.
+    """
+
+    def __init__(self, blob, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        if not -len(self) <= row < len(self):
+            raise IndexError(row)
+        row %= len(self)
+        return bytes(self.blob[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+class MappedRecords(Sequence):
+    """Read-only metadata rows stored as one JSON object per MappedTexts row, decoded on access"""
+
+    def __init__(self, texts: MappedTexts):
+        self.texts = texts
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, row: int) -> Dict:
+        return json.loads(self.texts[row])
+
+class NumpyVectorIndex:
+    """In-process cosine index over one contiguous float32 matrix.
+
+    Implements the part of the Chroma collection API the search functions use
+    (get, upsert, delete, query, count), so it can stand in for a collection.
+    Filters are resolved to boolean masks over metadata columns before scoring.
+    """
+
+    def __init__(self, name: str, metadata: Dict = None, embedding_function=None, path: str = None,
+                 quantization: str = None, rerank_factor: int = 4):
+        self.name = name
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self.metadata = dict(metadata or {})
+        self.embedding_function = embedding_function
+        self.path = path
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict] = []
+        self._row_of: Dict[str, int] = {}
+        self._embeddings = np.zeros((0, 0), dtype=np.float32)
+        # Preallocated rows behind _embeddings, grown geometrically so appends are amortized O(1)
+        self._buffer: Optional[np.ndarray] = None
+        self._columns: Dict[str, Column] = {}
+        self._masks: Dict[tuple, np.ndarray] = {}
+        self._quantized = None
+        # Recent query vectors, the probes for sample_recall
+        self._recent_queries: deque = deque(maxlen=RECALL_PROBES)
+        self._queries_since_recall = 0
+        self._recall: Optional[float] = None
+        self._metadata_index = None
+        self._dirty = False
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def _invalidate(self):
+        self._columns = {}
+        self._masks = {}
+        self._quantized = None
+        self._recall = None
+        self._metadata_index = None
+        self._dirty = True
+
+    def _reserve(self, rows: int, dim: int):
+        """Make _embeddings a writable view of rows x dim, reallocating the buffer only when it is full"""
+        buffer = self._buffer
+        if buffer is None or buffer.shape[1] != dim or len(buffer) < rows:
+            capacity = max(rows, 2 * len(buffer) if buffer is not None else 0, 64)
+            buffer = np.empty((capacity, dim), dtype=np.float32)
+            kept = min(len(self._embeddings), rows)
+            if kept:
+                # Also detaches from a shared read-only mapping
+                buffer[:kept] = self._embeddings[:kept]
+            self._buffer = buffer
+        self._embeddings = buffer[:rows]
+
+    def _detach_rows(self):
+        """Copy memory-mapped documents and metadata into lists before editing them"""
+        if not isinstance(self._documents, list):
+            self._documents = list(self._documents)
+        if not isinstance(self._metadatas, list):
+            self._metadatas = list(self._metadatas)
+
+    def _candidate_rows(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Resolve filters to candidate rows before scoring; None means every row"""
+        if not where:
+            return None
+        if self._metadata_index is None:
+            self._metadata_index = MetadataIndex(len(self._ids), self._column)
+        rows = self._metadata_index.resolve(where)
+        return np.flatnonzero(self._where_mask(where)) if rows is None else rows
+
+    def _quantized_matrix(self):
+        """Quantized codes and scale; a loaded index maps the persisted ones, an edited one quantizes in memory"""
+        if self._quantized is None:
+            self._quantized = quantize_embeddings(np.asarray(self._embeddings), self.quantization)
+        return self._quantized
+
+    def _approximate_scores(self, queries: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        """Score candidates against the quantized matrix, a chunk of rows at a time"""
+        codes, scale = self._quantized_matrix()
+        if scale is not None:
+            queries = queries * scale
+        scores = np.empty((len(queries), len(candidates)), dtype=np.float32)
+        for start in range(0, len(candidates), SCORING_CHUNK_ROWS):
+            rows = candidates[start:start + SCORING_CHUNK_ROWS]
+            scores[:, start:start + len(rows)] = queries @ codes[rows].astype(np.float32).T
+        return scores
+
+    def get(self, ids: List[str] = None, include: List[str] = None) -> Dict[str, Any]:
+        include = include or ["metadatas", "documents"]
+        with self._lock:
+            if ids is None:
+                rows = list(range(len(self._ids)))
+            else:
+                rows = [self._row_of[doc_id] for doc_id in ids if doc_id in self._row_of]
+            result = {"ids": [self._ids[row] for row in rows]}
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadatas[row] for row in rows]
+            if "documents" in include:
+                result["documents"] = [self._documents[row] for row in rows]
+            if "embeddings" in include:
+                result["embeddings"] = self._embeddings[rows]
+            return result
+
+    def upsert(self, ids: List[str], documents: List[str] = None, metadatas: List[Dict] = None,
+               embeddings=None):
+        if not ids:
+            return
+        if embeddings is None:
+            embeddings = self.embedding_function(documents)
+        embeddings = normalize_rows(embeddings)
+        documents = documents or [""] * len(ids)
+        metadatas = metadatas or [{} for _ in ids]
+
+        with self._lock:
+            self._detach_rows()
+            new_rows = [i for i, doc_id in enumerate(ids) if doc_id not in self._row_of]
+            self._reserve(len(self._ids) + len(new_rows), embeddings.shape[1])
+
+            for i, doc_id in enumerate(ids):
+                row = self._row_of.get(doc_id)
+                if row is None:
+                    continue
+                self._embeddings[row] = embeddings[i]
+                self._documents[row] = documents[i]
+                self._metadatas[row] = metadatas[i]
+
+            if new_rows:
+                start = len(self._ids)
+                self._embeddings[start:] = embeddings[new_rows]
+                for offset, i in enumerate(new_rows):
+                    self._row_of[ids[i]] = start + offset
+                    self._ids.append(ids[i])
+                    self._documents.append(documents[i])
+                    self._metadatas.append(metadatas[i])
+
+            self._invalidate()
+
+    def add(self, ids: List[str], documents: List[str] = None, metadatas: List[Dict] = None,
+            embeddings=None):
+        self.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            doomed = {doc_id for doc_id in ids if doc_id in self._row_of}
+            if not doomed:
+                return
+            keep = [row for row, doc_id in enumerate(self._ids) if doc_id not in doomed]
+            self._embeddings = np.ascontiguousarray(self._embeddings[keep])
+            self._buffer = self._embeddings
+            self._ids = [self._ids[row] for row in keep]
+            self._documents = [self._documents[row] for row in keep]
+            self._metadatas = [self._metadatas[row] for row in keep]
+            self._row_of = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            self._invalidate()
+
+    def _column(self, field: str) -> Column:
+        """A metadata field as a column; loaded indexes already hold FILTER_COLUMNS, others are built from the rows"""
+        if field not in self._columns:
+            self._columns[field] = build_column([metadata.get(field) for metadata in self._metadatas])
+        return self._columns[field]
+
+    def _field_mask(self, field: str, condition) -> np.ndarray:
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        mask = np.ones(len(self._ids), dtype=bool)
+        for op, value in condition.items():
+            key = (field, op, json.dumps(value, sort_keys=True))
+            if key not in self._masks:
+                self._masks[key] = self._operator_mask(self._column(field), op, value)
+            mask &= self._masks[key]
+        return mask
+
+    def _operator_mask(self, column: Column, op: str, value) -> np.ndarray:
+        if op == "$contains":
+            # Like Chroma, $contains only matches items of list fields
+            if isinstance(column, ListColumn):
+                return column.contains_mask(value)
+            return np.zeros(len(self._ids), dtype=bool)
+        if isinstance(column, ListColumn):
+            raise ValueError(f"Unsupported filter operator for a list field: {op}")
+
+        # A categorical column is tested once per distinct value, then expanded by code
+        values = column.vocab_array() if isinstance(column, CategoricalColumn) else column
+        if op == "$in":
+            matched = np.isin(values, value)
+        elif op == "$nin":
+            matched = ~np.isin(values, value)
+        elif op in COMPARISON_OPERATORS:
+            matched = np.asarray(COMPARISON_OPERATORS[op](values, value), dtype=bool)
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        return matched[column.codes] if isinstance(column, CategoricalColumn) else matched
+
+    def _where_mask(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        mask = np.ones(len(self._ids), dtype=bool)
+        for field, condition in where.items():
+            if field == "$and":
+                for clause in condition:
+                    mask &= self._where_mask(clause)
+            elif field == "$or":
+                any_mask = np.zeros(len(self._ids), dtype=bool)
+                for clause in condition:
+                    any_mask |= self._where_mask(clause)
+                mask &= any_mask
+            else:
+                mask &= self._field_mask(field, condition)
+        return mask
+
+    def query(self, query_embeddings=None, query_texts: List[str] = None, n_results: int = 10,
+              where: Dict = None, include: List[str] = None,
+              exact: bool = False) -> Dict[str, List]:
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        queries = normalize_rows(query_embeddings)
+        include = include or ["metadatas", "documents", "distances"]
+
+        with self._lock:
+            if self.quantization and not exact:
+                self._recent_queries.extend(queries)
+                self._queries_since_recall += len(queries)
+            results = {"ids": [], "distances": [], "metadatas": [], "documents": []}
+            filtered = self._candidate_rows(where)
+            candidates = np.arange(len(self._ids)) if filtered is None else filtered
+            if len(candidates) == 0:
+                for key in results:
+                    results[key] = [[] for _ in range(len(queries))]
+                return results
+
+            k = min(n_results, len(candidates))
+            if self.quantization and not exact:
+                # Shortlist on the quantized vectors, then re-rank the shortlist exactly
+                approximate = self._approximate_scores(queries, candidates)
+                shortlist_size = min(len(candidates), k * self.rerank_factor)
+                pools = []
+                for query, row_scores in zip(queries, approximate):
+                    pool = candidates[top_k_positions(row_scores, shortlist_size)]
+                    pools.append((pool, np.asarray(self._embeddings[pool]) @ query))
+            else:
+                matrix = self._embeddings if filtered is None else self._embeddings[candidates]
+                pools = [(candidates, row_scores) for row_scores in queries @ matrix.T]
+
+            for pool, pool_scores in pools:
+                top = top_k_positions(pool_scores, k)
+                rows = pool[top]
+                results["ids"].append([self._ids[row] for row in rows])
+                results["distances"].append([float(1 - score) for score in pool_scores[top]])
+                if "metadatas" in include:
+                    results["metadatas"].append([self._metadatas[row] for row in rows])
+                if "documents" in include:
+                    results["documents"].append([self._documents[row] for row in rows])
+            return results
+
+    def measure_recall(self, query_embeddings, k: int = 5, where: Dict = None) -> float:
+        """Recall@k of the quantized search against exact full-precision search"""
+        approximate = self.query(query_embeddings=query_embeddings, n_results=k, where=where)
+        exact = self.query(query_embeddings=query_embeddings, n_results=k, where=where, exact=True)
+        found = 0
+        total = 0
+        for approximate_ids, exact_ids in zip(approximate["ids"], exact["ids"]):
+            found += len(set(approximate_ids) & set(exact_ids))
+            total += len(exact_ids)
+        return found / total if total else 1.0
+
+    def sample_recall(self, k: int = 5) -> Optional[float]:
+        """Recall@k of the quantized search on the last RECALL_PROBES queries; None if not quantized or unqueried.
+
+        The exact search this needs reads the whole float32 matrix, so a
+        result is reused until the index changes or the probes have all been
+        replaced by newer queries.
+        """
+        with self._lock:
+            if not self.quantization or not self._recent_queries:
+                return None
+            if self._recall is None or self._queries_since_recall >= RECALL_PROBES:
+                probes = list(self._recent_queries)
+                self._recall = self.measure_recall(np.asarray(probes), k)
+                # measure_recall's own approximate search recorded the probes again
+                self._recent_queries = deque(probes, maxlen=RECALL_PROBES)
+                self._queries_since_recall = 0
+            return self._recall
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rows": self.count(),
+            "quantization": self.quantization,
+            "recall_at_5": self.sample_recall(5),
+        }
+
+    def persist(self):
+        """Write the index to disk if it changed since the last save"""
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            write_matrix_files(self.path, self.metadata, self._ids, self._embeddings,
+                               self._documents, self._metadatas, self.quantization)
+            self._dirty = False
+
+    def load(self, mmap: bool = True) -> bool:
+        """Load a previously persisted index; returns False if none exists"""
+        files = read_matrix_files(self.path, mmap) if self.path else None
+        if not files:
+            return False
+        if files["metadata"].get("embedding_model") != self.metadata.get("embedding_model"):
+            return False
+        with self._lock:
+            self._embeddings = files["embeddings"]
+            self._buffer = None
+            self._ids = [str(doc_id) for doc_id in files["ids"]]
+            self._documents = files["documents"]
+            self._metadatas = files["metadatas"]
+            self._row_of = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            self._columns = dict(files["columns"])
+            self._masks = {}
+            # Persisted codes are only usable if they were written in this index's mode
+            self._quantized = files["quantized"] if files["quantization"] == self.quantization else None
+            self._recall = None
+            self._metadata_index = None
+            self._dirty = False
+        return True
+
+def top_k_positions(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first"""
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+def _save_atomic(path: str, array: np.ndarray):
+    # Replace rather than overwrite so readers that mmap'd the old file keep a valid view
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+def _save_texts_atomic(path: str, texts: List[str]):
+    """Write texts as one UTF-8 blob (path.bin) plus row offsets (path_offsets.npy)"""
+    encoded = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in encoded], out=offsets[1:])
+    with open(path + ".bin.tmp", "wb") as file:
+        file.write(b"".join(encoded))
+    os.replace(path + ".bin.tmp", path + ".bin")
+    _save_atomic(path + "_offsets.npy", offsets)
+
+def _load_texts(path: str, use_mmap: bool) -> MappedTexts:
+    with open(path + ".bin", "rb") as file:
+        # An empty file cannot be mapped
+        if use_mmap and os.fstat(file.fileno()).st_size:
+            blob = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            blob = file.read()
+    return MappedTexts(blob, np.load(path + "_offsets.npy", mmap_mode="r" if use_mmap else None))
+
+def write_matrix_files(path: str, index_metadata: Dict, ids: List[str], embeddings: np.ndarray,
+                       documents: List[str], metadatas: List[Dict], quantization: str = None):
+    """Write an index as mmap-able files, with records.json written last.
+
+    Layout: embeddings.npy (float32, rows L2-normalized), with quantization
+    also embeddings_<mode>.npy (float16 or int8 codes) and, for int8,
+    embeddings_int8_scale.npy (float32 per dimension), ids.npy (unicode),
+    one column per FILTER_COLUMNS field (<field>.npy as float64,
+    <field>_codes.npy as int32 with its vocabulary in records.json, or for
+    list fields <field>_offsets.npy as int64 row offsets into
+    <field>_codes.npy), and
+    documents/metadatas as UTF-8 blobs (.bin) with row offsets (_offsets.npy),
+    metadata rows as JSON.
+    """
+    os.makedirs(path, exist_ok=True)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    _save_atomic(os.path.join(path, "embeddings.npy"), embeddings)
+    if quantization:
+        codes, scale = quantize_embeddings(embeddings, quantization)
+        _save_atomic(os.path.join(path, f"embeddings_{quantization}.npy"), codes)
+        if scale is not None:
+            _save_atomic(os.path.join(path, f"embeddings_{quantization}_scale.npy"), scale)
+    _save_atomic(os.path.join(path, "ids.npy"), np.asarray(ids, dtype=str))
+    _save_texts_atomic(os.path.join(path, "documents"), documents)
+    _save_texts_atomic(os.path.join(path, "metadatas"), [json.dumps(metadata) for metadata in metadatas])
+
+    numeric_columns, vocabularies, list_vocabularies = [], {}, {}
+    for field in FILTER_COLUMNS:
+        column = build_column([metadata.get(field) for metadata in metadatas])
+        if isinstance(column, ListColumn):
+            _save_atomic(os.path.join(path, f"{field}_offsets.npy"), column.offsets)
+            _save_atomic(os.path.join(path, f"{field}_codes.npy"), column.codes)
+            list_vocabularies[field] = column.vocab
+        elif isinstance(column, CategoricalColumn):
+            _save_atomic(os.path.join(path, f"{field}_codes.npy"), column.codes)
+            vocabularies[field] = column.vocab
+        else:
+            _save_atomic(os.path.join(path, f"{field}.npy"), column)
+            numeric_columns.append(field)
+
+    records_path = os.path.join(path, "records.json")
+    with open(records_path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump({
+            "format": MATRIX_FORMAT_VERSION,
+            "metadata": index_metadata,
+            "quantization": quantization,
+            "numeric_columns": numeric_columns,
+            "vocabularies": vocabularies,
+            "list_vocabularies": list_vocabularies,
+        }, file)
+    os.replace(records_path + ".tmp", records_path)
+
+def read_matrix_files(path: str, mmap: bool = True) -> Optional[Dict[str, Any]]:
+    """Read files written by write_matrix_files, memory-mapping arrays and text blobs.
+
+    Returns None if there is no index or it was written in an older format.
+    """
+    records_path = os.path.join(path, "records.json")
+    if not os.path.exists(records_path):
+        return None
+    mmap_mode = "r" if mmap else None
+    with open(records_path, "r", encoding="utf-8") as file:
+        records = json.load(file)
+    if records.get("format") != MATRIX_FORMAT_VERSION:
+        return None
+    records["embeddings"] = np.load(os.path.join(path, "embeddings.npy"), mmap_mode=mmap_mode)
+    records["ids"] = np.load(os.path.join(path, "ids.npy"))
+    records["quantized"] = None
+    quantization = records.get("quantization")
+    if quantization:
+        # Scoring scans these codes; the float32 matrix is only read for the rows being re-ranked
+        codes = np.load(os.path.join(path, f"embeddings_{quantization}.npy"), mmap_mode=mmap_mode)
+        scale_path = os.path.join(path, f"embeddings_{quantization}_scale.npy")
+        scale = np.load(scale_path) if os.path.exists(scale_path) else None
+        records["quantized"] = (codes, scale)
+    records["documents"] = _load_texts(os.path.join(path, "documents"), mmap)
+    records["metadatas"] = MappedRecords(_load_texts(os.path.join(path, "metadatas"), mmap))
+    columns = {field: np.load(os.path.join(path, f"{field}.npy"), mmap_mode=mmap_mode)
+               for field in records["numeric_columns"]}
+    for field, vocab in records["vocabularies"].items():
+        columns[field] = CategoricalColumn(np.load(os.path.join(path, f"{field}_codes.npy"), mmap_mode=mmap_mode),
+                                           vocab)
+    for field, vocab in records["list_vocabularies"].items():
+        columns[field] = ListColumn(np.load(os.path.join(path, f"{field}_offsets.npy"), mmap_mode=mmap_mode),
+                                    np.load(os.path.join(path, f"{field}_codes.npy"), mmap_mode=mmap_mode), vocab)
+    records["columns"] = columns
+    return records
+
+def open_numpy_index(name: str, metadata: Dict, embedding_function, root: str,
+                     mmap: bool = True, quantization: str = None,
+                     rerank_factor: int = 4) -> NumpyVectorIndex:
+    """Open a persisted NumPy index under root, or start an empty one"""
+    index = NumpyVectorIndex(name, metadata, embedding_function, os.path.join(root, name),
+                             quantization, rerank_factor)
+    index.load(mmap)
+    return index
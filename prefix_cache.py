@@ -0,0 +1,75 @@
+import copy
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from startup_profile import timed_import
+
+class PromptPrefixCache:
+    """Key/value cache of fixed prompt prefixes, prefilled once per model load.
+
+    A request whose token ids start with a stored prefix gets its own copy of
+    that prefix's cache, so generate() only prefills the tokens after it
+    (the query and retrieved context). Copies are needed because generation
+    appends to the cache in place.
+    """
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.entries: Dict[Tuple[int, ...], object] = {}
+        self.hits = 0
+        self.misses = 0
+        self.reused_tokens = 0
+        self._lock = threading.Lock()
+
+    def warm(self, prefix_ids: List[int]):
+        key = tuple(prefix_ids)
+        if not key or key in self.entries:
+            return
+        torch = timed_import("torch")
+        DynamicCache = timed_import("transformers").DynamicCache
+        with torch.no_grad():
+            output = self.llm._model(
+                input_ids=torch.tensor([prefix_ids], device=self.llm._model.device),
+                past_key_values=DynamicCache(),
+                use_cache=True,
+            )
+        with self._lock:
+            self.entries[key] = output.past_key_values
+
+    def lookup(self, input_ids: List[int]):
+        """A private copy of the longest stored prefix cache input_ids starts with, or None"""
+        with self._lock:
+            matches = [
+                key for key in self.entries
+                if len(key) < len(input_ids) and tuple(input_ids[:len(key)]) == key
+            ]
+            if not matches:
+                self.misses += 1
+                return None
+            key = max(matches, key=len)
+            self.hits += 1
+            self.reused_tokens += len(key)
+            cache = self.entries[key]
+        return copy.deepcopy(cache)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "prefixes": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "reused_tokens": self.reused_tokens,
+        }
+
+prefix_caches: Dict[int, PromptPrefixCache] = {}
+
+def get_prefix_cache(llm) -> Optional[PromptPrefixCache]:
+    return prefix_caches.get(id(llm))
+
+def warm_prefix_cache(llm, prefixes: List[List[int]]) -> Optional[PromptPrefixCache]:
+    """Prefill and keep the cache for each prefix; None for LLMs without a local model"""
+    if getattr(llm, "_model", None) is None:
+        return None
+    cache = prefix_caches.setdefault(id(llm), PromptPrefixCache(llm))
+    for prefix_ids in prefixes:
+        cache.warm(prefix_ids)
+    return cache
@@ -0,0 +1,337 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+def normalize_query(query: str) -> str:
+    """Normalize query text so trivially different spellings share a cache entry"""
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+def remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class QueryEmbeddingCache:
+    """LRU cache of query text -> embedding, bounded by entry count and bytes.
+
+    Entries evicted from memory are optionally spilled to spill_dir as .npy files
+    and promoted back on the next lookup, which deletes the file. The spill
+    files are an LRU of their own, bounded by max_spill_bytes; the oldest are
+    deleted first.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024,
+                 spill_dir: Optional[str] = None, max_spill_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # Spill file path -> size on disk, oldest spill first
+        self._spilled = OrderedDict()
+        self._spill_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spill_hits = 0
+
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            # Files spilled by earlier runs count against the bound too
+            paths = [entry.path for entry in os.scandir(spill_dir) if entry.name.endswith(".npy")]
+            for path in sorted(paths, key=os.path.getmtime):
+                self._spilled[path] = os.path.getsize(path)
+                self._spill_bytes += self._spilled[path]
+            self._trim_spill()
+
+    def _key(self, model_name: str, query: str) -> str:
+        return f"{model_name}\n{normalize_query(query)}"
+
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npy")
+
+    def get(self, model_name: str, query: str) -> Optional[np.ndarray]:
+        key = self._key(model_name, query)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        if self.spill_dir:
+            path = self._spill_path(key)
+            with self._lock:
+                spilled = self._spilled.pop(path, None)
+                if spilled is not None:
+                    self._spill_bytes -= spilled
+            if spilled is not None:
+                try:
+                    embedding = np.load(path)
+                except Exception:
+                    embedding = None
+                # The entry moves back into memory (or was unreadable), so its file is no longer needed
+                remove_file(path)
+                if embedding is not None:
+                    with self._lock:
+                        self.hits += 1
+                        self.spill_hits += 1
+                    self._store(key, embedding)
+                    return embedding
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, model_name: str, query: str, embedding) -> None:
+        self._store(self._key(model_name, query), np.asarray(embedding, dtype=np.float32))
+
+    def _store(self, key: str, embedding: np.ndarray) -> None:
+        if embedding.nbytes > self.max_bytes:
+            return
+
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key).nbytes
+            self._entries[key] = embedding
+            self._bytes += embedding.nbytes
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                old_key, old_embedding = self._entries.popitem(last=False)
+                self._bytes -= old_embedding.nbytes
+                self.evictions += 1
+                evicted.append((old_key, old_embedding))
+
+        if self.spill_dir and evicted:
+            spilled = []
+            for old_key, old_embedding in evicted:
+                path = self._spill_path(old_key)
+                try:
+                    np.save(path, old_embedding)
+                    spilled.append((path, os.path.getsize(path)))
+                except Exception as e:
+                    print(f"Error spilling query embedding to disk: {e}")
+            with self._lock:
+                for path, size in spilled:
+                    self._spill_bytes += size - self._spilled.pop(path, 0)
+                    self._spilled[path] = size
+            self._trim_spill()
+
+    def _trim_spill(self) -> None:
+        """Delete the oldest spill files until they fit in max_spill_bytes"""
+        expired = []
+        with self._lock:
+            while self._spill_bytes > self.max_spill_bytes and self._spilled:
+                path, size = self._spilled.popitem(last=False)
+                self._spill_bytes -= size
+                expired.append(path)
+        for path in expired:
+            remove_file(path)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "spill_hits": self.spill_hits,
+                "spill_files": len(self._spilled),
+                "spill_bytes": self._spill_bytes,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+def cached_embed(cache: QueryEmbeddingCache, model_name: str, queries: List[str], embed_fn) -> List[np.ndarray]:
+    """Embed queries, calling embed_fn only once for the texts missing from the cache"""
+    embeddings = [cache.get(model_name, query) for query in queries]
+
+    missing = {}
+    for i, embedding in enumerate(embeddings):
+        if embedding is None:
+            missing.setdefault(normalize_query(queries[i]), []).append(i)
+
+    if missing:
+        texts = list(missing)
+        for text, embedding in zip(texts, embed_fn(texts)):
+            embedding = np.asarray(embedding, dtype=np.float32)
+            cache.put(model_name, text, embedding)
+            for i in missing[text]:
+                embeddings[i] = embedding
+
+    return embeddings
+
+class SearchResultCache:
+    """LRU cache of search result records keyed by query, filters, k, projected fields and index version"""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(self, collection_name: str, index_version: int, query: str,
+                 filters: Optional[Dict], n_results: int, fields: tuple = ()) -> tuple:
+        filter_items = tuple(sorted((k, v) for k, v in (filters or {}).items() if v is not None))
+        return (collection_name, index_version, normalize_query(query), filter_items, n_results, fields)
+
+    def get(self, key: tuple) -> Optional[List]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                # Result records are read-only, so callers can share them
+                return list(self._entries[key])
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, results: List) -> None:
+        with self._lock:
+            self._entries[key] = tuple(results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+class SemanticResponseCache:
+    """Generated RAG answers, reused for near-identical questions that retrieved the same dishes.
+
+    A lookup hits when an unexpired entry has exactly the same set of retrieved
+    food ids and a query embedding within similarity_threshold (cosine).
+    Entries are evicted LRU beyond max_entries, expire after ttl_seconds, and
+    are dropped as soon as any dish they were generated from changes.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600,
+                 similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        # entry id -> (results key, unit query embedding, answer, stored at)
+        self._entries = OrderedDict()
+        self._by_results = {}
+        self._by_food = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def _remove(self, entry_id: int) -> None:
+        results_key, _, _, _ = self._entries.pop(entry_id)
+        self._by_results[results_key].discard(entry_id)
+        if not self._by_results[results_key]:
+            del self._by_results[results_key]
+        collection_name, food_ids = results_key
+        for food_id in food_ids:
+            entries = self._by_food.get((collection_name, food_id))
+            if entries is not None:
+                entries.discard(entry_id)
+                if not entries:
+                    del self._by_food[(collection_name, food_id)]
+
+    def get(self, collection_name: str, food_ids: List[str], query_embedding,
+            now: Optional[float] = None) -> Optional[str]:
+        results_key = (collection_name, frozenset(food_ids))
+        query = self._unit(query_embedding)
+        now = time.time() if now is None else now
+        with self._lock:
+            best_id, best_similarity = None, self.similarity_threshold
+            for entry_id in list(self._by_results.get(results_key, ())):
+                _, embedding, _, stored_at = self._entries[entry_id]
+                if now - stored_at > self.ttl_seconds:
+                    self._remove(entry_id)
+                    self.evictions += 1
+                    continue
+                similarity = float(embedding @ query)
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][2]
+
+    def put(self, collection_name: str, food_ids: List[str], query_embedding, answer: str,
+            now: Optional[float] = None) -> None:
+        results_key = (collection_name, frozenset(food_ids))
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (results_key, self._unit(query_embedding), answer,
+                                       time.time() if now is None else now)
+            self._by_results.setdefault(results_key, set()).add(entry_id)
+            for food_id in results_key[1]:
+                self._by_food.setdefault((collection_name, food_id), set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, collection_name: str, food_ids: Iterable[str]) -> int:
+        """Drop every answer generated from any of these dishes; returns how many were dropped"""
+        with self._lock:
+            stale = set()
+            for food_id in food_ids:
+                stale.update(self._by_food.get((collection_name, food_id), ()))
+            for entry_id in stale:
+                self._remove(entry_id)
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_results.clear()
+            self._by_food.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import List, Optional, Tuple
+from urllib.parse import urlencode
+
+import config
+
+SAMPLE_QUERIES = [
+    "chocolate dessert", "healthy meal", "creamy pasta", "spicy curry",
+    "light fresh meal", "comfort food", "sweet treats", "baked goods",
+    "low calorie breakfast", "protein rich dinner", "Italian food", "crispy snack",
+]
+
+async def send_request(host: str, port: int, path: str) -> Tuple[int, float, Optional[float]]:
+    """Send one GET request and return (status, latency, time to first streamed token) in seconds"""
+    started = time.perf_counter()
+    first_token = None
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    response = b""
+    while True:
+        data = await reader.read(4096)
+        if not data:
+            break
+        response += data
+        if first_token is None and b'"token"' in response:
+            first_token = time.perf_counter() - started
+    writer.close()
+    status = int(response.split(b" ", 2)[1]) if response else 0
+    return status, time.perf_counter() - started, first_token
+
+async def worker(host: str, port: int, endpoint: str, count: int, latencies: List[float],
+                 first_tokens: List[float], errors: List[int], stream: bool = False):
+    for _ in range(count):
+        params = {"q": random.choice(SAMPLE_QUERIES), "n": 5}
+        if endpoint == "/search/filtered":
+            params["max_calories"] = random.choice([250, 400, 600])
+        if stream:
+            params["stream"] = 1
+        status, latency, first_token = await send_request(host, port, f"{endpoint}?{urlencode(params)}")
+        if status == 200:
+            latencies.append(latency)
+            if first_token is not None:
+                first_tokens.append(first_token)
+        else:
+            errors.append(status)
+
+def print_percentiles(name: str, samples: List[float]):
+    ordered = sorted(samples)
+    for label, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+        print(f"{name} {label}: {ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000:.1f} ms")
+
+async def run_load(host: str, port: int, endpoint: str, concurrency: int, total: int, stream: bool = False):
+    latencies: List[float] = []
+    first_tokens: List[float] = []
+    errors: List[int] = []
+    per_worker = max(1, total // concurrency)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        worker(host, port, endpoint, per_worker, latencies, first_tokens, errors, stream)
+        for _ in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - started
+
+    print(f"\n📈 LOAD TEST: {endpoint} with {concurrency} concurrent clients")
+    print("=" * 50)
+    print(f"Requests: {len(latencies)} ok, {len(errors)} failed in {elapsed:.2f}s")
+    print(f"Throughput: {len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        print_percentiles("Latency", latencies)
+    if first_tokens:
+        print_percentiles("Time to first token", first_tokens)
+
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /stats HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    stats = json.loads(response.split(b"\r\n\r\n", 1)[1])
+    print(f"Mean micro-batch size: {stats['batcher']['mean_batch_size']:.1f}")
+    if stats.get("generation"):
+        generation = stats["generation"]
+        print(f"Mean generation batch size: {generation['mean_batch_size']:.1f}, "
+              f"{generation['tokens_per_second']:.1f} tokens/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for search_service.py")
+    parser.add_argument("--host", default=config.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVICE_PORT)
+    parser.add_argument("--endpoint", default="/search", choices=["/search", "/search/filtered", "/rag"])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--stream", action="store_true", help="request streamed /rag answers")
+    args = parser.parse_args()
+    asyncio.run(run_load(args.host, args.port, args.endpoint, args.concurrency, args.requests, args.stream))
+
+if __name__ == "__main__":
+    main()
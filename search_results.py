@@ -0,0 +1,101 @@
+import json
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Tuple
+
+# Result field -> metadata key it is decoded from; the rest come from the index itself
+METADATA_FIELDS = {
+    "food_name": "name",
+    "food_description": "description",
+    "cuisine_type": "cuisine_type",
+    "food_calories_per_serving": "calories",
+    "food_ingredients": "ingredients",
+    "food_health_benefits": "health_benefits",
+    "cooking_method": "cooking_method",
+    "taste_profile": "taste_profile",
+    "food_features": "features",
+    "protein_g": "protein_g",
+    "fat_g": "fat_g",
+    "carbohydrates_g": "carbohydrates_g",
+}
+# What the plain search CLIs display
+BASIC_RESULT_FIELDS = ("food_id", "food_name", "food_description", "cuisine_type",
+                       "food_calories_per_serving", "similarity_score", "distance")
+ALL_RESULT_FIELDS = BASIC_RESULT_FIELDS + tuple(field for field in METADATA_FIELDS if field not in BASIC_RESULT_FIELDS)
+
+# Everything a RAG answer uses, whether from the LLM prompt or the template fallback
+RAG_RESULT_FIELDS = BASIC_RESULT_FIELDS + ("food_ingredients", "food_health_benefits",
+                                           "cooking_method", "taste_profile", "food_features")
+
+class FoodSearchResult(Mapping):
+    """One search hit holding only its projected fields.
+
+    Slots keep each record small, and the read-only mapping interface lets
+    callers keep using result['food_name'] and result.get(...).
+    """
+
+    __slots__ = ALL_RESULT_FIELDS + ("_fields",)
+
+    def __init__(self, fields: Tuple[str, ...], values: Iterable):
+        self._fields = fields
+        for field, value in zip(fields, values):
+            setattr(self, field, value)
+
+    def __getitem__(self, field: str):
+        if field not in self._fields:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def __repr__(self) -> str:
+        return f"FoodSearchResult({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict:
+        return {field: getattr(self, field) for field in self._fields}
+
+def normalize_fields(fields: Iterable[str] = None) -> Tuple[str, ...]:
+    """Validate a projection and put it in canonical order (so it can be part of a cache key)"""
+    if fields is None:
+        return BASIC_RESULT_FIELDS
+    requested = set(fields)
+    unknown = requested.difference(ALL_RESULT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown result fields: {', '.join(sorted(unknown))}")
+    return tuple(field for field in ALL_RESULT_FIELDS if field in requested)
+
+def decode_result_rows(ids: List[str], metadatas: List[Dict], distances: List[float],
+                       fields: Tuple[str, ...]) -> List[FoodSearchResult]:
+    """Decode one query's raw rows into records carrying just the projected fields"""
+    decoders = []
+    for field in fields:
+        if field == "food_id":
+            decoders.append(lambda doc_id, metadata, distance: doc_id)
+        elif field == "similarity_score":
+            # Keyword-only hits have no distance, and so no similarity
+            decoders.append(lambda doc_id, metadata, distance: None if distance is None else 1 - distance)
+        elif field == "distance":
+            decoders.append(lambda doc_id, metadata, distance: distance)
+        elif field == "food_ingredients":
+            # Stored as one comma-separated string because metadata values must be scalars
+            decoders.append(lambda doc_id, metadata, distance: [
+                ingredient for ingredient in (metadata.get("ingredients") or "").split(", ") if ingredient
+            ])
+        elif field == "food_features":
+            decoders.append(lambda doc_id, metadata, distance: json.loads(metadata.get("features") or "{}"))
+        else:
+            key = METADATA_FIELDS[field]
+            decoders.append(lambda doc_id, metadata, distance, key=key: metadata.get(key))
+
+    return [
+        FoodSearchResult(fields, [decode(doc_id, metadata or {}, distance) for decode in decoders])
+        for doc_id, metadata, distance in zip(ids, metadatas, distances)
+    ]
+
+def format_similarity(result, suffix: str = "") -> str:
+    """Similarity as a percentage ("87.3%" + suffix), or "keyword match" for a hit found by BM25 alone"""
+    score = result.get('similarity_score')
+    return "keyword match" if score is None else f"{score * 100:.1f}%{suffix}"
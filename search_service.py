@@ -0,0 +1,423 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import config
+from shared_functions import *
+from answer_policy import answer_policy
+from search_results import normalize_fields
+from generation_scheduler import start_generation_scheduler
+from llm_generation import warm_prompt_prefixes
+from prefix_cache import get_prefix_cache
+from enhanced_rag_chatbot import (create_hf_LLM, generate_fallback_response, generate_llm_rag_response, hf_login,
+                                  stream_llm_rag_response, warm_up_llm)
+from startup_profile import print_startup_report, startup_phase
+
+FILTER_PARAMS = {
+    "cuisine": ("cuisine_filter", str),
+    "max_calories": ("max_calories", int),
+    "ingredient": ("ingredient_filter", str),
+    "min_protein": ("min_protein", float),
+    "max_protein": ("max_protein", float),
+    "min_fat": ("min_fat", float),
+    "max_fat": ("max_fat", float),
+    "min_carbohydrates": ("min_carbohydrates", float),
+    "max_carbohydrates": ("max_carbohydrates", float),
+}
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error",
+                503: "Service Unavailable"}
+
+class MicroBatcher:
+    """Coalesce search requests arriving within a short window into one batched search"""
+
+    def __init__(self, collection, window_ms: float = config.SERVICE_BATCH_WINDOW_MS,
+                 max_batch_size: int = config.SERVICE_MAX_BATCH_SIZE):
+        self.collection = collection
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.batches = 0
+        self.requests = 0
+
+    async def search(self, query: str, filters: Optional[Dict] = None, n_results: int = 5,
+                     fields=None) -> List[Dict]:
+        fields = normalize_fields(fields)
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((query, filters, n_results, fields, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batches += 1
+            self.requests += len(batch)
+            # Requests asking for the same result count and projection share one batched search, so the
+            # fused ranking and keyword fast path see exactly what a lone request would; queries repeated
+            # across groups are embedded once thanks to the query embedding cache
+            groups = {}
+            for item in batch:
+                groups.setdefault((item[2], item[3]), []).append(item)
+
+            for (n_results, fields), members in groups.items():
+                try:
+                    results = await loop.run_in_executor(
+                        None, perform_batch_similarity_search, self.collection,
+                        [item[0] for item in members], [item[1] for item in members], n_results, fields
+                    )
+                except Exception as e:
+                    for *_, future in members:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                for (*_, future), result in zip(members, results):
+                    if not future.done():
+                        future.set_result(result)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+        }
+
+class SearchService:
+    """Minimal asyncio HTTP/1.1 service exposing basic, filtered and RAG search"""
+
+    def __init__(self, collection, model=None):
+        self.collection = collection
+        self.model = model
+        self.batcher = MicroBatcher(collection)
+        self.scheduler = start_generation_scheduler(model) if model is not None else None
+        # Without a batching scheduler the single in-process model generates one prompt at a time;
+        # with one, enough prompts are let through to fill the next batch while the current one runs
+        self.generation_batch_size = config.GENERATION_MAX_BATCH_SIZE if self.scheduler is not None else 1
+        generation_concurrency = 2 * self.generation_batch_size if self.scheduler is not None else 1
+        self.generation_slots = asyncio.Semaphore(generation_concurrency)
+        # A generating request holds its thread for a whole batch, so generation gets its own pool
+        # instead of the loop's default executor, which search batches and cache lookups need
+        self.generation_executor = ThreadPoolExecutor(max_workers=generation_concurrency,
+                                                      thread_name_prefix="rag-generation")
+        # RAG requests generating or waiting to; the answer policy degrades to templates when this backs up
+        self.active_generations = 0
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, body = await read_request(reader)
+            status, payload = await self.route(method, path, body)
+        except ValueError as e:
+            status, payload = 400, {"error": str(e)}
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+        try:
+            if hasattr(payload, "__aiter__"):
+                await write_ndjson_stream(writer, status, payload)
+            else:
+                await write_json(writer, status, payload)
+        finally:
+            writer.close()
+
+    async def route(self, method: str, path: str, body: bytes) -> Tuple[int, Dict]:
+        url = urlsplit(path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if body:
+            # Decode errors are ValueErrors too, so they become 400s
+            payload = json.loads(body.decode("utf-8"))
+            if not isinstance(payload, dict):
+                raise ValueError("Request body must be a JSON object")
+            params.update(payload)
+
+        if url.path == "/health":
+            return 200, {"status": "ok"}
+        if url.path == "/stats":
+            index_stats = getattr(self.collection, "stats", None)
+            return 200, {
+                # The NumPy backend reports its quantization and sampled recall; Chroma has no stats
+                "vector_index": await asyncio.get_running_loop().run_in_executor(None, index_stats)
+                if callable(index_stats) else None,
+                "batcher": self.batcher.stats(),
+                "generation": self.scheduler.stats() if self.scheduler is not None else None,
+                "prompt_prefix_cache": get_prefix_cache(self.model).stats()
+                if get_prefix_cache(self.model) is not None else None,
+                "query_embedding_cache": query_embedding_cache.stats(),
+                "search_result_cache": search_result_cache.stats(),
+                "rag_response_cache": rag_response_cache.stats(),
+                "answer_policy": answer_policy.stats(),
+            }
+        if url.path not in ("/search", "/search/filtered", "/rag"):
+            return 404, {"error": f"Unknown endpoint {url.path}"}
+
+        query = str(params.get("q", "")).strip()
+        if not query:
+            raise ValueError("Missing query parameter 'q'")
+        n_results = parse_result_count(params.get("n", 5))
+        filters = parse_filters(params) if url.path == "/search/filtered" else None
+        fields = parse_fields(params.get("fields"))
+
+        started = time.perf_counter()
+        if url.path == "/rag":
+            stream = str(params.get("stream", "")).lower() in ("1", "true", "yes")
+            return await self.handle_rag(query, started, stream)
+
+        results = await self.batcher.search(query, filters, n_results, fields)
+        return 200, {
+            "query": query,
+            "results": results,
+            "latency_ms": (time.perf_counter() - started) * 1000,
+        }
+
+    async def handle_rag(self, query: str, started: float, stream: bool = False) -> Tuple[int, Dict]:
+        if self.model is None:
+            return 503, {"error": "RAG endpoint needs the service started with --rag"}
+        search_results = await self.batcher.search(query, None, 3, RAG_RESULT_FIELDS)
+        loop = asyncio.get_running_loop()
+        query_embedding, cached_answer = await loop.run_in_executor(
+            None, get_cached_rag_response, self.collection, query, search_results
+        )
+        degraded_reason = None
+        if cached_answer is None:
+            degraded_reason = answer_policy.decide(search_results, self.active_generations, self.generation_batch_size)
+        if stream:
+            return 200, self.stream_rag(query, search_results, started, query_embedding, cached_answer, degraded_reason)
+
+        answer = cached_answer
+        if degraded_reason is not None:
+            answer = generate_fallback_response(query, search_results)
+        elif answer is None:
+            self.active_generations += 1
+            try:
+                async with self.generation_slots:
+                    generation_started = time.perf_counter()
+                    answer = await loop.run_in_executor(
+                        self.generation_executor, generate_llm_rag_response, query, search_results, self.model
+                    )
+                    answer_policy.observe_generation(time.perf_counter() - generation_started)
+            finally:
+                self.active_generations -= 1
+            if answer != generate_fallback_response(query, search_results):
+                store_rag_response(self.collection, query_embedding, search_results, answer)
+        return 200, {
+            "query": query,
+            "answer": answer,
+            "cached": cached_answer is not None,
+            "degraded": degraded_reason is not None,
+            "degraded_reason": degraded_reason,
+            "results": search_results,
+            "latency_ms": (time.perf_counter() - started) * 1000,
+        }
+
+    async def stream_rag(self, query: str, search_results: List[Dict], started: float,
+                         query_embedding=None, cached_answer: Optional[str] = None,
+                         degraded_reason: Optional[str] = None) -> AsyncIterator[Dict]:
+        """Yield the retrieved results, then each generated token, then the timings"""
+        yield {"query": query, "results": search_results}
+        if cached_answer is not None or degraded_reason is not None:
+            # Answered without generation, so the whole answer is one event
+            if cached_answer is not None:
+                yield {"token": cached_answer}
+            else:
+                yield {"token": generate_fallback_response(query, search_results)}
+            latency_ms = (time.perf_counter() - started) * 1000
+            yield {"done": True, "cached": cached_answer is not None, "degraded": degraded_reason is not None,
+                   "degraded_reason": degraded_reason, "time_to_first_token_ms": latency_ms,
+                   "latency_ms": latency_ms}
+            return
+
+        loop = asyncio.get_running_loop()
+        tokens: asyncio.Queue = asyncio.Queue()
+        finished = object()
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for token in stream_llm_rag_response(query, search_results, self.model):
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(tokens.put_nowait, token)
+            finally:
+                loop.call_soon_threadsafe(tokens.put_nowait, finished)
+
+        first_token_ms = None
+        pieces = []
+        self.active_generations += 1
+        try:
+            async with self.generation_slots:
+                generation_started = time.perf_counter()
+                producer = loop.run_in_executor(self.generation_executor, produce)
+                try:
+                    while True:
+                        token = await tokens.get()
+                        if token is finished:
+                            break
+                        if first_token_ms is None:
+                            first_token_ms = (time.perf_counter() - started) * 1000
+                        pieces.append(token)
+                        yield {"token": token}
+                    await producer
+                    answer_policy.observe_generation(time.perf_counter() - generation_started)
+                finally:
+                    # Stops reading early if the client went away mid-stream
+                    stop.set()
+        finally:
+            self.active_generations -= 1
+
+        answer = "".join(pieces).strip()
+        # Same bar generate_llm_rag_response applies before it falls back to the template answer
+        if len(answer) >= 50:
+            store_rag_response(self.collection, query_embedding, search_results, answer)
+        yield {
+            "done": True,
+            "cached": False,
+            "degraded": False,
+            "degraded_reason": None,
+            "time_to_first_token_ms": first_token_ms,
+            "latency_ms": (time.perf_counter() - started) * 1000,
+        }
+
+    async def serve(self, host: str, port: int):
+        batcher_task = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"🌐 Food search service listening on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher_task.cancel()
+            self.generation_executor.shutdown(wait=False)
+
+def parse_result_count(value) -> int:
+    """Validate the requested number of results, 1..SERVICE_MAX_RESULTS"""
+    try:
+        n_results = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid value for 'n': {value}")
+    if not 1 <= n_results <= config.SERVICE_MAX_RESULTS:
+        raise ValueError(f"'n' must be between 1 and {config.SERVICE_MAX_RESULTS}")
+    return n_results
+
+def parse_fields(value) -> Optional[List[str]]:
+    """Validate the requested projection: a comma-separated string or a JSON list of field names"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return [field.strip() for field in value.split(",") if field.strip()]
+    if not isinstance(value, list) or not all(isinstance(field, str) for field in value):
+        raise ValueError("'fields' must be a comma-separated string or a list of strings")
+    return value
+
+def parse_filters(params: Dict) -> Dict:
+    """Map query-string filter names onto perform_filtered_similarity_search arguments"""
+    filters = {}
+    for param, (argument, cast) in FILTER_PARAMS.items():
+        value = params.get(param)
+        if value not in (None, ""):
+            try:
+                filters[argument] = cast(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid value for '{param}': {value}")
+    return filters
+
+async def read_request(reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    parts = request_line.split()
+    if len(parts) < 2:
+        raise ValueError("Malformed request line")
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1")
+        if line in ("\r\n", "\n", ""):
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0) or 0)
+    body = await reader.readexactly(length) if length else b""
+    return parts[0].upper(), parts[1], body
+
+async def write_json(writer: asyncio.StreamWriter, status: int, payload: Dict):
+    body = json.dumps(payload, default=dict).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status} {HTTP_REASONS.get(status, 'OK')}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: close\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+
+async def write_ndjson_stream(writer: asyncio.StreamWriter, status: int, events: AsyncIterator[Dict]):
+    """Send one JSON object per line using chunked transfer encoding, flushing each as it arrives"""
+    writer.write(
+        f"HTTP/1.1 {status} {HTTP_REASONS.get(status, 'OK')}\r\n"
+        f"Content-Type: application/x-ndjson\r\n"
+        f"Transfer-Encoding: chunked\r\n"
+        f"Connection: close\r\n\r\n".encode("latin-1")
+    )
+
+    async def write_chunk(event: Dict):
+        line = (json.dumps(event, default=dict) + "\n").encode("utf-8")
+        writer.write(f"{len(line):x}\r\n".encode("latin-1") + line + b"\r\n")
+        await writer.drain()
+
+    try:
+        async for event in events:
+            await write_chunk(event)
+    except ConnectionError:
+        raise
+    except Exception as e:
+        # Headers are already sent, so errors travel in-band as the last event
+        await write_chunk({"error": str(e)})
+    finally:
+        # Frees the generation slot promptly if the client disconnected
+        await events.aclose()
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP food search service")
+    parser.add_argument("--host", default=config.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVICE_PORT)
+    parser.add_argument("--rag", action="store_true", help="load the LLM and enable /rag")
+    args = parser.parse_args()
+
+    with startup_phase("load food catalog"):
+        food_items = load_food_data('./FoodDataSet.json')
+    collection = create_similarity_search_view(
+        "food_search_service",
+        {'description': 'Collection behind the HTTP search service'}
+    )
+    with startup_phase("populate vector index"):
+        populate_similarity_collection(collection, food_items)
+
+    model = None
+    if args.rag:
+        hf_login()
+        model = create_hf_LLM()
+        with startup_phase("LLM warm-up"):
+            warm_up_llm(model)
+        with startup_phase("prefill prompt template prefixes"):
+            warm_prompt_prefixes(model)
+    print_startup_report()
+
+    try:
+        asyncio.run(SearchService(collection, model).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n👋 Search service stopped")
+
+if __name__ == "__main__":
+    main()
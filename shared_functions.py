@@ -1,40 +1,194 @@
-import chromadb
-from chromadb.utils import embedding_functions
+from startup_profile import startup_phase, timed_import
+import hashlib
 import json
+import os
 import re
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 
-client = chromadb.Client()
+import config
+from query_cache import QueryEmbeddingCache, SearchResultCache, SemanticResponseCache, cached_embed
+from numpy_index import normalize_rows, open_numpy_index, write_matrix_files
+from ingest import IngestProgress, run_embedding_pipeline
+from model_registry import embedding_model_registry
+from collection_views import CollectionView
+from lexical_index import BM25Index, is_keyword_query, reciprocal_rank_fusion
+from search_results import (BASIC_RESULT_FIELDS, RAG_RESULT_FIELDS, FoodSearchResult, decode_result_rows,
+                            normalize_fields)
+
+# Opened on first use so importing this module stays cheap (chromadb alone takes ~1s)
+client = None
+
+def get_client():
+    """Return the persistent Chroma client, importing chromadb on first use"""
+    global client
+    if client is None:
+        chromadb = timed_import("chromadb")
+        with startup_phase("open Chroma vector store"):
+            client = chromadb.PersistentClient(path=config.VECTOR_STORE_PATH)
+    return client
+
+query_embedding_cache = QueryEmbeddingCache(
+    max_entries=config.QUERY_CACHE_MAX_ENTRIES,
+    max_bytes=config.QUERY_CACHE_MAX_BYTES,
+    spill_dir=config.QUERY_CACHE_SPILL_DIR,
+    max_spill_bytes=config.QUERY_CACHE_SPILL_MAX_BYTES
+)
+
+search_result_cache = SearchResultCache(max_entries=config.RESULT_CACHE_MAX_ENTRIES)
+
+rag_response_cache = SemanticResponseCache(
+    max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.RESPONSE_CACHE_TTL_SECONDS,
+    similarity_threshold=config.RESPONSE_CACHE_SIMILARITY
+)
+
+# Bumped whenever a collection's contents change; part of every result cache key
+index_versions = {}
+
+# BM25 index per physical collection, rebuilt by populate and sync
+lexical_indexes = {}
+
+# Physical indexes opened by views in this process, and the views themselves, by name
+shared_indexes = {}
+collection_views = {}
+
+# Fingerprint of the catalog each physical collection was last fully indexed from
+indexed_catalogs = {}
+
+def collection_key(collection) -> str:
+    """Identify a collection across backends that may reuse the same name"""
+    collection = getattr(collection, "physical", collection)
+    return f"{type(collection).__name__}:{collection.name}"
+
+def get_index_version(collection) -> int:
+    return index_versions.get(collection_key(collection), 0)
+
+def bump_index_version(collection) -> int:
+    """Mark a collection's contents as changed so cached results are no longer served"""
+    index_versions[collection_key(collection)] = get_index_version(collection) + 1
+    return index_versions[collection_key(collection)]
+
+MACRO_NUTRIENTS = ("protein", "fat", "carbohydrates")
+
+def parse_grams(value) -> Optional[float]:
+    """Parse a nutrition amount such as "42g", "1.5 g" or "300mg" into grams"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+
+    match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*(mg|g|kg)?\s*$", value.lower())
+    if not match:
+        return None
+    amount = float(match.group(1))
+    unit = match.group(2) or "g"
+    return amount * {"mg": 0.001, "g": 1.0, "kg": 1000.0}[unit]
+
+def normalize_food_item(item: Dict, index: int) -> Dict:
+    """Fill in defaults and derived fields for one raw catalog item"""
+    if "food_id" not in item:
+        item['food_id'] = str(index + 1)
+    else:
+        item['food_id'] = str(item['food_id'])
+    
+    if 'food_ingredients' not in item:
+        item['food_ingredients'] = []
+    if 'food_description' not in item:
+        item['food_description'] = ''
+    if 'cuisine_type' not in item:
+        item['cuisine_type'] = 'Unknown'
+    if 'food_calories_per_serving' not in item:
+        item['food_calories_per_serving'] = 0
+
+    # Parse nutrition strings like "42g" once so they can be filtered numerically
+    nutrition = item.get('food_nutritional_factors')
+    for macro in MACRO_NUTRIENTS:
+        grams = parse_grams(nutrition.get(macro)) if isinstance(nutrition, dict) else None
+        if grams is not None:
+            item[f'{macro}_g'] = grams
+
+    if "food_features" in item and isinstance(item["food_features"], dict):
+        taste_features= []
+        for key, value in item['food_features'].items():
+            if value:
+                taste_features.append(str(value))
+        item['taste_profile'] = ', '.join(taste_features)
+    else :
+        item['taste_profile'] = ''
+
+    return item
+
+def iter_json_array(file, chunk_size: int = 64 * 1024) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array one at a time, reading the file in chunks"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    at_eof = False
+
+    while True:
+        # Skip whitespace and separators between elements
+        while position < len(buffer) and (buffer[position].isspace() or (started and buffer[position] == ",")):
+            position += 1
+
+        if position < len(buffer):
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError("Expected a JSON array of food items")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if at_eof:
+                    raise
+            else:
+                # A number cut off at a chunk boundary still decodes ("12" of "12345"),
+                # so an element only counts once the delimiter after it has been read
+                if at_eof or (end < len(buffer) and (buffer[end].isspace() or buffer[end] in ",]")):
+                    yield element
+                    buffer = buffer[end:]
+                    position = 0
+                    continue
+        elif at_eof:
+            raise ValueError("Unexpected end of JSON array")
+
+        chunk = file.read(chunk_size)
+        if not chunk:
+            at_eof = True
+        buffer = buffer[position:] + chunk
+        position = 0
+
+def iter_food_items(file_path: str) -> Iterator[Dict]:
+    """Yield normalized food items from a JSON array or JSON Lines file without loading it whole"""
+    with open(file_path, "r", encoding="utf-8") as file:
+        if file_path.endswith((".jsonl", ".ndjson")):
+            raw_items = (json.loads(line) for line in file if line.strip())
+        else:
+            raw_items = iter_json_array(file)
+        for i, item in enumerate(raw_items):
+            yield normalize_food_item(item, i)
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[List]:
+    """Group any iterable into lists of at most batch_size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 def load_food_data(file_path: str) -> List[Dict]:
     try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            food_data = json.load(file)
-        
-        for i, item in enumerate(food_data):
-            if "food_id" not in item:
-                item['food_id'] = str(i + 1)
-            else:
-                item['food_id'] = str(item['food_id'])
-            
-            if 'food_ingredients' not in item:
-                item['food_ingredients'] = []
-            if 'food_description' not in item:
-                item['food_description'] = ''
-            if 'cuisine_type' not in item:
-                item['cuisine_type'] = 'Unknown'
-            if 'food_calories_per_serving' not in item:
-                item['food_calories_per_serving'] = 0
-
-            if "food_features" in item and isinstance(item["food_features"], dict):
-                taste_features= []
-                for key, value in item['food_features'].items():
-                    if value:
-                        taste_features.append(str(value))
-                item['taste_profile'] = ', '.join(taste_features)
-            else :
-                item['taste_profile'] = ''
+        food_data = list(iter_food_items(file_path))
         
         print(f"Successfully loaded {len(food_data)} food items from {file_path}")
         return food_data
@@ -43,52 +197,137 @@ def load_food_data(file_path: str) -> List[Dict]:
         return []
 
 def create_similarity_search_collection(collection_name: str, collection_metadata: dict = None):
+    """Open (or create) a persistent collection bound to the configured embedding model"""
+    model_name = config.EMBEDDING_MODEL_NAME
+    metadata = dict(collection_metadata or {})
+    metadata['embedding_model'] = model_name
+
+    if config.VECTOR_BACKEND == "numpy":
+        with startup_phase(f"open NumPy index {collection_name}"):
+            return open_numpy_index(
+                collection_name, metadata, embedding_model_registry.lazy(model_name),
+                os.path.join(config.VECTOR_STORE_PATH, "numpy"),
+                mmap=config.NUMPY_INDEX_MMAP,
+                quantization=config.NUMPY_INDEX_QUANTIZATION,
+                rerank_factor=config.NUMPY_INDEX_RERANK_FACTOR
+            )
+
+    # Embeddings from a different model are not comparable, so start over
     try:
-        client.delete_collection(collection_name)
+        existing = get_client().get_collection(collection_name)
+        if (existing.metadata or {}).get('embedding_model') != model_name:
+            get_client().delete_collection(collection_name)
     except Exception:
         pass
 
-    sentence_transformer_ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"
-    )
+    # A lazy stand-in keeps the model unloaded until a query actually needs it
+    sentence_transformer_ef = embedding_model_registry.lazy_chroma_function(model_name)
 
-    return client.create_collection(
+    return get_client().get_or_create_collection(
         name= collection_name,
-        metadata= collection_metadata,
+        metadata= metadata,
         embedding_function= sentence_transformer_ef,
         configuration={
             "hnsw": {"space": "cosine"},
         }
     )
 
-def populate_similarity_collection(collection, food_items: List[Dict]):
+def create_similarity_search_view(view_name: str, view_metadata: dict = None,
+                                  index_name: str = config.SHARED_INDEX_NAME) -> CollectionView:
+    """Open a named view over a shared physical index instead of a separate collection"""
+    if index_name not in shared_indexes:
+        shared_indexes[index_name] = create_similarity_search_collection(
+            index_name, {'description': 'Shared food catalog index'}
+        )
+    view = CollectionView(view_name, shared_indexes[index_name], view_metadata)
+    collection_views[view_name] = view
+    return view
+
+def get_embedding_function(model_name: str = None):
+    """Return the shared embedding function for a model, loading it on first use"""
+    return embedding_model_registry.get(model_name or config.EMBEDDING_MODEL_NAME)
+
+def build_food_document(food: Dict) -> str:
+    """Build the text that gets embedded for a single food item"""
+    text = f"Name: {food['food_name']}. "
+    text += f"Description: {food.get('food_description', '')}. "
+    text += f"Ingredients: {', '.join(food.get('food_ingredients', []))}. "
+    text += f"Cuisine: {food.get('cuisine_type', 'Unknown')}. "
+    text += f"Cooking method: {food.get('cooking_method', '')}. "
+
+    taste_profile = food.get('taste_profile','')
+    if taste_profile:
+        text += f"Taste and features: {taste_profile}. "
+
+    health_benefits = food.get('food_health_benefits', '')
+    if health_benefits:
+        text += f"Health benefits: {health_benefits}. "
+
+    if 'food_nutritional_factors' in food:
+        nutrition = food['food_nutritional_factors']
+        if isinstance(nutrition, dict):
+            nutrition_text = ', '.join([f"{k}: {v}" for k, v in nutrition.items()])
+            text += f"Nutrition: {nutrition_text}."
+
+    return text
+
+def build_lexical_text(food: Dict) -> str:
+    """The fields keyword queries are matched against: name, ingredients and taste profile"""
+    name = food.get('food_name', '')
+    # The name is repeated so a keyword in the dish's name outweighs one buried in its ingredients
+    return " ".join([name, name, " ".join(food.get('food_ingredients', [])), food.get('taste_profile', '')])
+
+def build_food_metadata(food: Dict) -> Dict[str, Any]:
+    """Build the metadata row stored alongside a food item's embedding"""
+    metadata = {
+        "name": food["food_name"],
+        "cuisine_type": food.get("cuisine_type", "Unknown"),
+        "ingredients": ", ".join(food.get("food_ingredients", [])),
+        "calories": food.get("food_calories_per_serving", 0),
+        "description": food.get("food_description", ""),
+        "cooking_method": food.get("cooking_method", ""),
+        "health_benefits": food.get("food_health_benefits", ""),
+        "taste_profile": food.get("taste_profile", "")
+    }
+    if isinstance(food.get("food_features"), dict):
+        # Kept structured (as JSON, since metadata values are scalars) so answers can phrase each feature
+        metadata["features"] = json.dumps(food["food_features"], sort_keys=True)
+    metadata.update({
+        f"{macro}_g": food[f"{macro}_g"] for macro in MACRO_NUTRIENTS if f"{macro}_g" in food
+    })
+    ingredient_list = ingredient_keys(food.get("food_ingredients", []))
+    if ingredient_list:
+        # Matched by the ingredient filter; Chroma rejects empty list values, so dishes without ingredients omit it
+        metadata["ingredient_list"] = ingredient_list
+    return metadata
+
+def ingredient_keys(ingredients: Iterable[str]) -> List[str]:
+    """Normalize ingredient names for matching: stripped, lowercased and without duplicates"""
+    keys = (str(ingredient).strip().lower() for ingredient in ingredients)
+    return list(dict.fromkeys(key for key in keys if key))
+
+def compute_content_hash(text: str, model_name: str = None, metadata: Dict = None) -> str:
+    """Hash a document, its metadata row and the model that embeds it"""
+    model_name = model_name or config.EMBEDDING_MODEL_NAME
+    metadata_text = json.dumps(metadata or {}, sort_keys=True)
+    return hashlib.sha256(f"{model_name}\n{text}\n{metadata_text}".encode("utf-8")).hexdigest()
+
+def prepare_food_records(food_items: List[Dict], used_ids: set = None,
+                         start_index: int = 0) -> Tuple[List[str], List[str], List[Dict]]:
+    """Turn food items into unique ids, documents and hashed metadata rows.
+
+    Pass the same used_ids set across calls to keep ids unique over a stream of batches.
+    """
     documents = []
     metadatas = []
     ids = []
 
-    used_ids = set()
+    if used_ids is None:
+        used_ids = set()
+
+    for i, food in enumerate(food_items, start_index):
+        text = build_food_document(food)
 
-    for i, food in enumerate(food_items):
-        text = f"Name: {food['food_name']}. "
-        text += f"Description: {food.get('food_description', '')}. "
-        text += f"Ingredients: {', '.join(food.get('food_ingredients', []))}. "
-        text += f"Cuisine: {food.get('cuisine_type', 'Unknown')}. "
-        text += f"Cooking method: {food.get('cooking_method', '')}. "
-
-        taste_profile = food.get('taste_profile','')
-        if taste_profile:
-            text += f"Taste and features: {taste_profile}. "
-
-        health_benefits = food.get('food_health_benefits', '')
-        if health_benefits:
-            text += f"Health benefits: {health_benefits}. "
-
-        if 'food_nutritional_factors' in food:
-            nutrition = food['food_nutritional_factors']
-            if isinstance(nutrition, dict):
-                nutrition_text = ', '.join([f"{k}: {v}" for k, v in nutrition.items()])
-                text += f"Nutrition: {nutrition_text}."
-        
         base_id = str(food.get('food_id', i))
         unique_id = base_id
         counter = 1
@@ -96,108 +335,438 @@ def populate_similarity_collection(collection, food_items: List[Dict]):
             unique_id = f"{base_id}_{counter}"
             counter += 1
         used_ids.add(unique_id)
-        
+
+        metadata = build_food_metadata(food)
+        metadata["content_hash"] = compute_content_hash(text, metadata=metadata)
+
         documents.append(text)
         ids.append(unique_id)
-        metadatas.append({
-            "name": food["food_name"],
-            "cuisine_type": food.get("cuisine_type", "Unknown"),
-            "ingredients": ", ".join(food.get("food_ingredients", [])),
-            "calories": food.get("food_calories_per_serving", 0),
-            "description": food.get("food_description", ""),
-            "cooking_method": food.get("cooking_method", ""),
-            "health_benefits": food.get("food_health_benefits", ""),
-            "taste_profile": food.get("taste_profile", "")
-        })
-    # Add all data to collection
-    collection.add(
-        documents=documents,
-        metadatas=metadatas,
-        ids=ids
-    )
-    
-    print(f"Added {len(food_items)} food items to collection")
+        metadatas.append(metadata)
+
+    return ids, documents, metadatas
+
+def get_indexed_hashes(collection, ids: List[str] = None) -> Dict[str, str]:
+    """Return the stored content hash for each indexed id"""
+    existing = collection.get(ids=ids, include=["metadatas"])
+    return {
+        doc_id: (metadata or {}).get("content_hash")
+        for doc_id, metadata in zip(existing['ids'], existing['metadatas'])
+    }
+
+def collection_embedding_function(collection):
+    """Embedding function matching the model a collection was built with, loaded on first call"""
+    model_name = (collection.metadata or {}).get('embedding_model') or config.EMBEDDING_MODEL_NAME
+    return embedding_model_registry.lazy(model_name)
+
+def populate_similarity_collection(collection, food_items: Iterable[Dict],
+                                   batch_size: int = config.INGEST_BATCH_SIZE,
+                                   workers: int = config.INGEST_WORKERS):
+    """Index food items batch by batch, embedding only new or changed documents.
+
+    food_items may be any iterable (e.g. iter_food_items), so memory stays
+    bounded by batch_size rather than the catalog size. Embedding runs in
+    `workers` threads, overlapped with building and inserting other batches.
+    Dishes the stored index holds but food_items no longer contains are deleted.
+    Populating a view whose shared index already holds the same list of
+    items returns immediately.
+    """
+    key = collection_key(collection)
+    digest = hashlib.sha256()
+    fingerprint = None
+    if isinstance(food_items, (list, tuple)):
+        # Lists can be read twice, so check for an unchanged catalog before touching the index
+        update_catalog_digest(digest, food_items)
+        fingerprint = digest.hexdigest()
+        if indexed_catalogs.get(key) == fingerprint and key in lexical_indexes:
+            print(f"Index already holds these {len(food_items)} food items")
+            return
+    indexed_catalogs.pop(key, None)
+
+    used_ids = set()
+    counts = {"total": 0}
+    applied_ids = []
+    lexical_index = BM25Index()
+
+    def pending_batches():
+        for batch in iter_batches(food_items, batch_size):
+            if fingerprint is None:
+                update_catalog_digest(digest, batch)
+            ids, documents, metadatas = prepare_food_records(batch, used_ids, counts["total"])
+            counts["total"] += len(ids)
+            for doc_id, food in zip(ids, batch):
+                lexical_index.add(doc_id, build_lexical_text(food))
 
-def perform_similarity_search(collection, query: str, n_results: int = 5) -> List[Dict]:
+            # Only embed documents whose text (or embedding model) has changed
+            indexed_hashes = get_indexed_hashes(collection, ids)
+            pending = [
+                i for i, doc_id in enumerate(ids)
+                if indexed_hashes.get(doc_id) != metadatas[i]["content_hash"]
+            ]
+            yield ([ids[i] for i in pending], [documents[i] for i in pending],
+                   [metadatas[i] for i in pending], len(ids))
 
+    total_hint = len(food_items) if hasattr(food_items, "__len__") else None
     try:
-        results = collection.query(
-            query_texts=[query],
-            n_results=n_results
+        embedded = run_embedding_pipeline(
+            collection, pending_batches(), collection_embedding_function(collection),
+            workers, IngestProgress(total_hint, "Indexing"), applied_ids
         )
+        # The store persists across runs, so dishes dropped from the catalog must be deleted explicitly
+        removed = remove_missing_items(collection, get_indexed_hashes(collection), used_ids,
+                                       batch_size, applied_ids)
+    finally:
+        # Runs after a failure too: batches upserted before it already changed the index
+        publish_collection_changes(collection, applied_ids)
+    total = counts["total"]
 
-        if not results or not results['ids'] or len(results['ids'][0]) == 0:
-            return []
-        
-        formatted_results = []
-        for i in range(len(results['ids'][0])):
-            similarity_score = 1 - results['distances'][0][i]
-
-            result = {
-                'food_id': results['ids'][0][i],
-                'food_name': results['metadatas'][0][i]['name'],
-                'food_description': results['metadatas'][0][i]['description'],
-                'cuisine_type': results['metadatas'][0][i]['cuisine_type'],
-                'food_calories_per_serving': results['metadatas'][0][i]['calories'],
-                'similarity_score': similarity_score,
-                'distance': results['distances'][0][i]
-            }
-            formatted_results.append(result)
-        
-        return formatted_results
+    if total == 0:
+        print("No food items to add to collection")
+        return
+    lexical_indexes[key] = lexical_index
+    indexed_catalogs[key] = fingerprint or digest.hexdigest()
+
+    print(f"Indexed {total} food items "
+          f"({embedded} embedded, {total - embedded} reused, {removed} removed)")
+
+def update_catalog_digest(digest, food_items: Iterable[Dict]):
+    """Feed food items, in order, into a running catalog fingerprint"""
+    for food in food_items:
+        digest.update(json.dumps(food, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\n")
+
+def remove_missing_items(collection, indexed_ids: Iterable[str], used_ids: set, batch_size: int,
+                         applied_ids: List[str]) -> int:
+    """Delete indexed ids the catalog no longer produced; returns how many were removed"""
+    removed = [doc_id for doc_id in indexed_ids if doc_id not in used_ids]
+    if not used_ids and removed:
+        # An empty or unreadable catalog must not wipe the index
+        print("Skipping removals: the new catalog is empty")
+        return 0
+    for start in range(0, len(removed), batch_size):
+        collection.delete(ids=removed[start:start + batch_size])
+        applied_ids.extend(removed[start:start + batch_size])
+    return len(removed)
+
+def publish_collection_changes(collection, changed_ids: List[str]):
+    """Stop serving cached results and answers for changed ids, then flush the index"""
+    if changed_ids:
+        bump_index_version(collection)
+        rag_response_cache.invalidate(collection_key(collection), changed_ids)
+    persist_collection(collection)
+
+def persist_collection(collection):
+    """Flush backends that buffer writes in memory (Chroma persists on its own)"""
+    persist = getattr(collection, "persist", None)
+    if callable(persist):
+        persist()
+
+def sync_similarity_collection(collection, food_items: Iterable[Dict],
+                               batch_size: int = config.SYNC_BATCH_SIZE,
+                               workers: int = config.INGEST_WORKERS) -> Dict[str, int]:
+    """Bring the collection in line with food_items by upserting and deleting only the differences"""
+    key = collection_key(collection)
+    indexed_catalogs.pop(key, None)
+    indexed_hashes = get_indexed_hashes(collection)
+    used_ids = set()
+    report = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+    applied_ids = []
+    lexical_index = BM25Index()
+    digest = hashlib.sha256()
+
+    def pending_batches():
+        for batch in iter_batches(food_items, batch_size):
+            update_catalog_digest(digest, batch)
+            ids, documents, metadatas = prepare_food_records(batch, used_ids, len(used_ids))
+            for doc_id, food in zip(ids, batch):
+                lexical_index.add(doc_id, build_lexical_text(food))
+
+            pending = []
+            for i, doc_id in enumerate(ids):
+                if doc_id not in indexed_hashes:
+                    report["added"] += 1
+                    pending.append(i)
+                elif indexed_hashes[doc_id] != metadatas[i]["content_hash"]:
+                    report["changed"] += 1
+                    pending.append(i)
+                else:
+                    report["unchanged"] += 1
+            yield ([ids[i] for i in pending], [documents[i] for i in pending],
+                   [metadatas[i] for i in pending], len(ids))
+
+    try:
+        run_embedding_pipeline(
+            collection, pending_batches(), collection_embedding_function(collection),
+            workers, IngestProgress(len(food_items) if hasattr(food_items, "__len__") else None, "Syncing"),
+            applied_ids
+        )
+
+        if used_ids:
+            lexical_indexes[key] = lexical_index
+        report["removed"] = remove_missing_items(collection, indexed_hashes, used_ids, batch_size, applied_ids)
+        if used_ids:
+            indexed_catalogs[key] = digest.hexdigest()
+    finally:
+        # A catalog that fails to parse partway through still leaves the batches before it applied
+        publish_collection_changes(collection, applied_ids)
+
+    print(f"Synced collection: {report['added']} added, {report['changed']} changed, "
+          f"{report['removed']} removed, {report['unchanged']} unchanged")
+    return report
+
+def export_embedding_matrix(food_items: Iterable[Dict], path: str, batch_size: int = config.SYNC_BATCH_SIZE):
+    """Embed food items and write them in the mmap-able format the NumPy backend loads"""
+    embedding_function = get_embedding_function()
+    used_ids = set()
+    ids, documents, metadatas, embedding_batches = [], [], [], []
+    for batch in iter_batches(food_items, batch_size):
+        batch_ids, batch_documents, batch_metadatas = prepare_food_records(batch, used_ids, len(ids))
+        embedding_batches.append(normalize_rows(embedding_function(batch_documents)))
+        ids.extend(batch_ids)
+        documents.extend(batch_documents)
+        metadatas.extend(batch_metadatas)
+
+    embeddings = np.vstack(embedding_batches) if embedding_batches else np.zeros((0, 0), dtype=np.float32)
+    write_matrix_files(path, {"embedding_model": config.EMBEDDING_MODEL_NAME}, ids, embeddings,
+                       documents, metadatas, config.NUMPY_INDEX_QUANTIZATION)
+    print(f"Exported {len(ids)} embeddings to {path}")
+
+def sync_catalog(collection, file_path: str) -> Dict[str, int]:
+    """Stream the dataset file and sync the collection against it"""
+    try:
+        return sync_similarity_collection(collection, iter_food_items(file_path))
     except Exception as e:
-        print(f"Error in similarity search: {e}")
-        return []
-    
-def perform_filtered_similarity_search(
-    collection, 
-    query: str, 
-    cuisine_filter: str = None, 
-    max_calories: int = None, 
-    n_results: int = 5
-    ) -> List[Dict]:
-    """Perform filtered similarity search with metadata constraints"""
-    where_clause = None
+        print(f"Error syncing catalog: {e}")
+        return {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
 
+def build_where_clause(cuisine_filter: str = None, max_calories: int = None, ingredient_filter: str = None,
+                       **macro_bounds) -> Optional[Dict]:
+    """Translate metadata search filters into a Chroma where clause.
+
+    ingredient_filter matches one whole ingredient, ignoring case.
+    macro_bounds may hold min_<macro>/max_<macro> gram limits for each of
+    MACRO_NUTRIENTS, e.g. min_protein=20.
+    """
     filters = []
     if cuisine_filter:
         filters.append({"cuisine_type": cuisine_filter})
-    
+
+    ingredient = ingredient_keys([ingredient_filter] if ingredient_filter else [])
+    if ingredient:
+        filters.append({"ingredient_list": {"$contains": ingredient[0]}})
+
     if max_calories:
         filters.append({"calories": {"$lte": max_calories}})
 
+    for macro in MACRO_NUTRIENTS:
+        if macro_bounds.get(f"min_{macro}") is not None:
+            filters.append({f"{macro}_g": {"$gte": float(macro_bounds[f"min_{macro}"])}})
+        if macro_bounds.get(f"max_{macro}") is not None:
+            filters.append({f"{macro}_g": {"$lte": float(macro_bounds[f"max_{macro}"])}})
+
     if len(filters) == 1:
-        where_clause = filters[0]
+        return filters[0]
     elif len(filters) > 1:
-        where_clause = {"$and": filters}
-    
+        return {"$and": filters}
+    return None
+
+def format_query_results(results, query_index: int = 0,
+                         fields: Tuple[str, ...] = BASIC_RESULT_FIELDS) -> List[FoodSearchResult]:
+    """Convert one query's raw index results into result records with the given fields"""
+    if not results or not results['ids'] or len(results['ids'][query_index]) == 0:
+        return []
+
+    return decode_result_rows(
+        results['ids'][query_index],
+        results['metadatas'][query_index],
+        results['distances'][query_index],
+        fields
+    )
+
+def embed_queries(collection, queries: List[str]):
+    """Embed a batch of query texts with the collection's embedding model, reusing cached vectors"""
+    model_name = (collection.metadata or {}).get('embedding_model') or config.EMBEDDING_MODEL_NAME
+    # Lazy so that a batch answered entirely from the cache never loads the model
+    return cached_embed(query_embedding_cache, model_name, queries, embedding_model_registry.lazy(model_name))
+
+def get_cached_rag_response(collection, query: str, search_results: List[Dict]) -> Tuple[np.ndarray, Optional[str]]:
+    """Return the query embedding and a cached answer for a near-identical question, if any"""
+    query_embedding = embed_queries(collection, [query])[0]
+    food_ids = [result['food_id'] for result in search_results]
+    return query_embedding, rag_response_cache.get(collection_key(collection), food_ids, query_embedding)
+
+def store_rag_response(collection, query_embedding, search_results: List[Dict], answer: str):
+    if answer:
+        food_ids = [result['food_id'] for result in search_results]
+        rag_response_cache.put(collection_key(collection), food_ids, query_embedding, answer)
+
+def has_filters(filters: Optional[Dict]) -> bool:
+    return any(value is not None for value in (filters or {}).values())
+
+def lexical_search_results(collection, lexical_index: BM25Index, query: str, n_results: int,
+                           fields: Tuple[str, ...]) -> Optional[List[FoodSearchResult]]:
+    """Rank by BM25 alone and decode hits from their metadata rows; the query is never embedded.
+
+    Without an embedding there is no cosine similarity, so similarity_score
+    and distance are None. Returns None when BM25 finds fewer than n_results
+    dishes, so the caller can fill the list through hybrid search instead.
+    """
+    hits = lexical_index.search(query, n_results)
+    if len(hits) < n_results:
+        return None
+    rows = collection.get(ids=[doc_id for doc_id, _ in hits], include=["metadatas"])
+    metadata_by_id = dict(zip(rows['ids'], rows['metadatas']))
+    hit_ids = [doc_id for doc_id, _ in hits if doc_id in metadata_by_id]
+    if len(hit_ids) < n_results:
+        return None
+    return decode_result_rows(hit_ids, [metadata_by_id[doc_id] for doc_id in hit_ids],
+                              [None] * len(hit_ids), fields)
+
+def fuse_hybrid_results(collection, lexical_index: BM25Index, query: str, query_embedding,
+                        ids: List[str], metadatas: List[Dict], distances: List[float],
+                        n_results: int, fields: Tuple[str, ...], filtered: bool) -> List[FoodSearchResult]:
+    """Merge vector candidates with BM25 hits by reciprocal rank fusion.
+
+    With filters the BM25 ranking is limited to the (already filtered) vector
+    candidates; without, lexical-only hits are fetched and scored against
+    the query embedding so every result carries a cosine similarity.
+    """
+    lexical_hits = lexical_index.search(query, max(len(ids), n_results), set(ids) if filtered else None)
+    fused = reciprocal_rank_fusion([ids, [doc_id for doc_id, _ in lexical_hits]])[:n_results]
+
+    rows = {doc_id: (metadata, distance) for doc_id, metadata, distance in zip(ids, metadatas, distances)}
+    missing = [doc_id for doc_id in fused if doc_id not in rows]
+    if missing:
+        fetched = collection.get(ids=missing, include=["metadatas", "embeddings"])
+        query_vector = normalize_rows(query_embedding)[0]
+        similarities = normalize_rows(fetched['embeddings']) @ query_vector if len(fetched['ids']) else []
+        for doc_id, metadata, similarity in zip(fetched['ids'], fetched['metadatas'], similarities):
+            rows[doc_id] = (metadata, float(1 - similarity))
+
+    fused = [doc_id for doc_id in fused if doc_id in rows]
+    return decode_result_rows(fused, [rows[doc_id][0] for doc_id in fused],
+                              [rows[doc_id][1] for doc_id in fused], fields)
+
+def perform_batch_similarity_search(
+    collection,
+    queries: List[str],
+    filters = None,
+    n_results: int = 5,
+    fields: Iterable[str] = None
+    ) -> List[List[FoodSearchResult]]:
+    """Search several queries with one embedding pass, returning results per query.
+
+    filters is either one dict of search filters (the keyword arguments of
+    perform_filtered_similarity_search) shared by every query, or a list with one such dict (or None) per query.
+    fields projects each result onto those fields (BASIC_RESULT_FIELDS by default,
+    RAG_RESULT_FIELDS for everything a RAG prompt uses). With HYBRID_SEARCH,
+    queries fuse BM25 with vector ranks, except that an unfiltered
+    single-keyword query with at least n_results BM25 hits is answered by BM25
+    alone, without a similarity score. RAG projections always fuse: RAG
+    embeds the query anyway and the answer policy needs real similarities.
+    """
+    if not queries:
+        return []
+    fields = normalize_fields(fields)
+
+    if filters is None or isinstance(filters, dict):
+        filters = [filters] * len(queries)
+
     try:
-        results = collection.query(
-            query_texts=[query],
-            n_results=n_results,
-            where=where_clause
-        )
-        
-        if not results or not results['ids'] or len(results['ids'][0]) == 0:
-            return []
-        
-        formatted_results = []
-        for i in range(len(results['ids'][0])):
-            similarity_score = 1 - results['distances'][0][i]
-            
-            result = {
-                'food_id': results['ids'][0][i],
-                'food_name': results['metadatas'][0][i]['name'],
-                'food_description': results['metadatas'][0][i]['description'],
-                'cuisine_type': results['metadatas'][0][i]['cuisine_type'],
-                'food_calories_per_serving': results['metadatas'][0][i]['calories'],
-                'similarity_score': similarity_score,
-                'distance': results['distances'][0][i]
-            }
-            formatted_results.append(result)
-        
-        return formatted_results
-        
+        index_version = get_index_version(collection)
+        all_results = [[] for _ in queries]
+        cache_keys = []
+        uncached = []
+        for i, query in enumerate(queries):
+            key = search_result_cache.make_key(collection_key(collection), index_version, query, filters[i],
+                                               n_results, fields)
+            cache_keys.append(key)
+            cached = search_result_cache.get(key)
+            if cached is None:
+                uncached.append(i)
+            else:
+                all_results[i] = cached
+
+        lexical_index = lexical_indexes.get(collection_key(collection)) if config.HYBRID_SEARCH else None
+        if lexical_index is not None and not set(RAG_RESULT_FIELDS).issubset(fields):
+            remaining = []
+            for i in uncached:
+                if not has_filters(filters[i]) and is_keyword_query(queries[i]):
+                    results = lexical_search_results(collection, lexical_index, queries[i], n_results, fields)
+                    if results is not None:
+                        all_results[i] = results
+                        search_result_cache.put(cache_keys[i], results)
+                        continue
+                remaining.append(i)
+            uncached = remaining
+
+        if not uncached:
+            return all_results
+
+        query_embeddings = embed_queries(collection, [queries[i] for i in uncached])
+        # Hybrid fusion re-ranks a wider vector shortlist
+        candidate_count = n_results * config.HYBRID_CANDIDATE_FACTOR if lexical_index is not None else n_results
+
+        # Queries sharing the same filters go to the index in a single call
+        groups = {}
+        for position, i in enumerate(uncached):
+            where_clause = build_where_clause(**(filters[i] or {}))
+            key = json.dumps(where_clause, sort_keys=True)
+            groups.setdefault(key, (where_clause, []))[1].append((position, i))
+
+        for where_clause, members in groups.values():
+            results = collection.query(
+                query_embeddings=[query_embeddings[position] for position, _ in members],
+                n_results=candidate_count,
+                where=where_clause,
+                # Results are decoded from metadata alone, so the stored documents are never fetched
+                include=["metadatas", "distances"]
+            )
+            for result_index, (position, query_index) in enumerate(members):
+                if lexical_index is not None and results['ids'] and results['ids'][result_index]:
+                    all_results[query_index] = fuse_hybrid_results(
+                        collection, lexical_index, queries[query_index], query_embeddings[position],
+                        results['ids'][result_index], results['metadatas'][result_index],
+                        results['distances'][result_index], n_results, fields, has_filters(filters[query_index])
+                    )
+                else:
+                    all_results[query_index] = format_query_results(results, result_index, fields)
+                search_result_cache.put(cache_keys[query_index], all_results[query_index])
+
+        return all_results
     except Exception as e:
-        print(f"Error in filtered search: {e}")
-        return []
+        print(f"Error in batch similarity search: {e}")
+        return [[] for _ in queries]
+
+def perform_similarity_search(collection, query: str, n_results: int = 5,
+                              fields: Iterable[str] = None) -> List[FoodSearchResult]:
+    """Perform similarity search for a single query"""
+    return perform_batch_similarity_search(collection, [query], n_results=n_results, fields=fields)[0]
+
+def perform_filtered_similarity_search(
+    collection, 
+    query: str, 
+    cuisine_filter: str = None, 
+    max_calories: int = None, 
+    n_results: int = 5,
+    ingredient_filter: str = None,
+    min_protein: float = None,
+    max_protein: float = None,
+    min_fat: float = None,
+    max_fat: float = None,
+    min_carbohydrates: float = None,
+    max_carbohydrates: float = None,
+    fields: Iterable[str] = None
+    ) -> List[FoodSearchResult]:
+    """Perform filtered similarity search with metadata constraints (macro bounds in grams)"""
+    filters = {
+        "cuisine_filter": cuisine_filter,
+        "max_calories": max_calories,
+        "ingredient_filter": ingredient_filter,
+        "min_protein": min_protein,
+        "max_protein": max_protein,
+        "min_fat": min_fat,
+        "max_fat": max_fat,
+        "min_carbohydrates": min_carbohydrates,
+        "max_carbohydrates": max_carbohydrates
+    }
+    return perform_batch_similarity_search(collection, [query], filters, n_results, fields)[0]
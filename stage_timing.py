@@ -0,0 +1,52 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+import config
+
+class RequestTimeline:
+    """Start and end offsets of each stage of one request, including stages run in other threads"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: List[Tuple[str, float, float]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stages.append((name, started - self.started, time.perf_counter() - self.started))
+
+    def run(self, name: str, function, *args, **kwargs):
+        """Call function as a timed stage; handy as an executor.submit target"""
+        with self.stage(name):
+            return function(*args, **kwargs)
+
+    def critical_path(self) -> List[Tuple[str, float, float]]:
+        """Walk back from the last stage to finish through the stages it had to wait for"""
+        path = []
+        cursor = float("inf")
+        while True:
+            candidates = [stage for stage in self.stages if stage[2] <= cursor and stage not in path]
+            if not candidates:
+                break
+            stage = max(candidates, key=lambda stage: stage[2])
+            path.append(stage)
+            cursor = stage[1]
+        return path[::-1]
+
+    def report(self, title: str):
+        if not config.SHOW_STAGE_TIMINGS or not self.stages:
+            return
+        total = time.perf_counter() - self.started
+        critical = set(self.critical_path())
+        print(f"\n⏱️ {title} ({total * 1000:.0f} ms end to end, * = critical path):")
+        for stage in sorted(self.stages, key=lambda stage: stage[1]):
+            name, start, end = stage
+            marker = "*" if stage in critical else " "
+            print(f"  {marker} {name:<28} {start * 1000:8.1f} → {end * 1000:8.1f} ms ({(end - start) * 1000:.1f} ms)")
@@ -0,0 +1,36 @@
+import importlib
+import sys
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+import config
+
+PROCESS_START = time.perf_counter()
+
+phase_timings: List[Tuple[str, float]] = []
+
+@contextmanager
+def startup_phase(name: str):
+    """Time a block of startup work under the given phase name"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phase_timings.append((name, time.perf_counter() - started))
+
+def timed_import(module_name: str):
+    """Import a module on first use, recording how long the import took"""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    with startup_phase(f"import {module_name}"):
+        return importlib.import_module(module_name)
+
+def print_startup_report():
+    """Print time spent per import and init phase since the process started"""
+    if not config.SHOW_STARTUP_PROFILE:
+        return
+    total = time.perf_counter() - PROCESS_START
+    print(f"\n⏱️ Startup profile ({total:.3f}s since launch):")
+    for name, seconds in phase_timings:
+        print(f"   {name:<40} {seconds:.3f}s")
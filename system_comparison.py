@@ -1,5 +1,6 @@
 from shared_functions import *
 from enhanced_rag_chatbot import *
+from search_results import format_similarity
 import time
 
 def main():
@@ -10,12 +11,12 @@ def main():
     # Load data once for all systems
     food_items = load_food_data('./FoodDataSet.json')
     
-    # Create collections for each system
-    interactive_collection = create_similarity_search_collection("comparison_interactive")
-    advanced_collection = create_similarity_search_collection("comparison_advanced")
-    rag_collection = create_similarity_search_collection("comparison_rag")
+    # Create a view for each system over one shared index
+    interactive_collection = create_similarity_search_view("comparison_interactive")
+    advanced_collection = create_similarity_search_view("comparison_advanced")
+    rag_collection = create_similarity_search_view("comparison_rag")
     
-    # Populate all collections
+    # The views share one index, so only the first populate embeds anything
     populate_similarity_collection(interactive_collection, food_items)
     populate_similarity_collection(advanced_collection, food_items)
     populate_similarity_collection(rag_collection, food_items)
@@ -34,7 +35,7 @@ def main():
     interactive_time = time.time() - start_time
     
     for i, result in enumerate(interactive_results, 1):
-        print(f"{i}. {result['food_name']} ({result['similarity_score']*100:.1f}% match)")
+        print(f"{i}. {result['food_name']} ({format_similarity(result, ' match')})")
         print(f"   {result['food_description']}")
     print(f"⏱️ Response time: {interactive_time:.3f} seconds")
     
@@ -109,5 +110,24 @@ def main():
     print(f"  Advanced: {advanced_time:.3f}s")
     print(f"  RAG Chatbot: {rag_time:.3f}s")
 
+    cache_stats = query_embedding_cache.stats()
+    print(f"\n🧠 Query embedding cache: {cache_stats['hits']} hits, "
+          f"{cache_stats['misses']} misses, {cache_stats['evictions']} evictions "
+          f"({cache_stats['hit_rate']*100:.1f}% hit rate)")
+    response_stats = rag_response_cache.stats()
+    print(f"♻️ RAG response cache: {response_stats['hits']} hits, {response_stats['misses']} misses, "
+          f"{response_stats['invalidations']} invalidated")
+
+    # Only the NumPy backend reports stats; recall is measured only for a quantized index
+    index_stats = rag_collection.stats() if callable(getattr(rag_collection, "stats", None)) else None
+    if index_stats and index_stats['quantization']:
+        print(f"🧮 {index_stats['quantization']} index: recall@5 {index_stats['recall_at_5']*100:.1f}% "
+              f"against exact search over {index_stats['rows']} rows")
+
+    for model_name, model_stats in embedding_model_registry.stats().items():
+        weights = model_stats['parameter_bytes']
+        weights_text = f", {weights / 1e6:.1f} MB weights" if weights else ""
+        print(f"📦 Embedding model {model_name}: loaded once in {model_stats['load_seconds']:.2f}s{weights_text}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file